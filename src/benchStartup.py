@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__license__     = 'MIT'
+__author__      = 'Alberto Pettarin (alberto@albertopettarin.it)'
+__copyright__   = '2012-2026 Alberto Pettarin (alberto@albertopettarin.it)'
+__version__     = 'v1.0.0'
+__date__        = '2026-10-16'
+__description__ = 'benchStartup measures the startup cost of each glyphIgo command'
+
+### BEGIN changelog ###
+#
+# 1.0.0 2026-10-16 Initial release
+#
+### END changelog ###
+
+import codecs, json, os, subprocess, sys, time
+
+class benchStartup:
+
+    # commands to benchmark: [label, arguments];
+    # {font} and {ebook} are replaced with the given files,
+    # commands using a missing file are skipped
+    COMMANDS = [
+        ["lookup", ["lookup", "-c", "0x203d"]],
+        ["lookup --heuristic", ["lookup", "--heuristic", "-c", "GREEK OMEGA OXIA"]],
+        ["list --blocks", ["list", "--blocks"]],
+        ["list -r", ["list", "-r", "0x2200-0x22ff"]],
+        ["list -f", ["list", "-f", "{font}", "--nocache"]],
+        ["list -e", ["list", "-e", "{ebook}"]],
+        ["count -e", ["count", "-e", "{ebook}"]],
+        ["check -f -e", ["check", "-f", "{font}", "-e", "{ebook}", "--nocache"]]
+    ]
+
+    # imports taking less than this (ms) are not reported
+    IMPORT_THRESHOLD = 1.0
+
+    ### BEGIN runChild ###
+    # runChild(arguments)
+    # runs glyphIgo with the given arguments in this process,
+    # timing the import of each module not yet loaded
+    # (cumulative, like the "cumulative" column of python3 -X importtime),
+    # and prints the timings as JSON
+    def runChild(self, arguments):
+        import __builtin__
+        originalImport = __builtin__.__import__
+        imports = {}
+
+        def timedImport(name, *args, **kwargs):
+            top = name.split(".")[0]
+            if ((len(name) == 0) or (top in sys.modules) or (top in imports)):
+                return originalImport(name, *args, **kwargs)
+            imports[top] = 0.0
+            start = time.time()
+            try:
+                return originalImport(name, *args, **kwargs)
+            finally:
+                imports[top] = (time.time() - start) * 1000
+
+        stdout = sys.stdout
+        sys.stdout = codecs.getwriter("utf-8")(open(os.devnull, "w"))
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        sys.argv = ["glyphIgo.py"] + arguments
+        start = time.time()
+        __builtin__.__import__ = timedImport
+        try:
+            import glyphIgo
+            glyphIgo.main()
+        except SystemExit:
+            pass
+        finally:
+            __builtin__.__import__ = originalImport
+        total = (time.time() - start) * 1000
+        sys.stdout.close()
+        sys.stdout = stdout
+        # the time of nested imports is also included in their parent
+        # (e.g., in glyphIgo), as in the cumulative column of -X importtime;
+        # relative imports inside packages (e.g., numpy) are not top-level modules
+        imports = dict([i for i in imports.items() if (i[0] in sys.modules)])
+        print json.dumps({"total": total, "imports": imports})
+    ### END runChild ###
+
+    ### BEGIN benchmark ###
+    # benchmark(arguments, runs)
+    # runs the given glyphIgo command runs times, each in a new interpreter,
+    # and returns [ wall times (ms), in-process times (ms), import times (ms) ]
+    def benchmark(self, arguments, runs):
+        wall = []
+        total = []
+        imports = {}
+        for i in range(runs):
+            start = time.time()
+            # the exit code of glyphIgo is not relevant here
+            child = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--child"] + arguments, stdout=subprocess.PIPE)
+            output = child.communicate()[0]
+            wall.append((time.time() - start) * 1000)
+            result = json.loads(output.splitlines()[-1])
+            total.append(result["total"])
+            for name, t in result["imports"].items():
+                imports.setdefault(name, []).append(t)
+        for name in imports:
+            imports[name] = self.median(imports[name])
+        return [wall, total, imports]
+    ### END benchmark ###
+
+    ### BEGIN median ###
+    def median(self, values):
+        values = sorted(values)
+        return values[len(values) // 2]
+    ### END median ###
+
+    ### BEGIN usage ###
+    # usage()
+    # print script usage
+    def usage(self):
+        print("")
+        print("$ python benchStartup.py [-n RUNS] [-f FONT] [-e EBOOK] [-j JSON]")
+        print("")
+        print("Optional arguments:")
+        print(" -n RUNS: run each command RUNS times (default: 5)")
+        print(" -f FONT: font file used by the commands needing a font")
+        print(" -e EBOOK: ebook file used by the commands needing an ebook")
+        print(" -j JSON: also append the results to JSON, one JSON line per command, to track regressions")
+        print("")
+        print("Examples:")
+        print(" $ python benchStartup.py -n 10 -f font.ttf -e ebook.epub")
+        print("   Print the median startup time of each command and the imports costing more than 1 ms")
+        print("")
+    ### END usage ###
+
+    ### BEGIN main ###
+    def main(self):
+        if ((len(sys.argv) > 1) and (sys.argv[1] == "--child")):
+            self.runChild(sys.argv[2:])
+            return
+
+        options = {"-n": "5", "-f": None, "-e": None, "-j": None}
+        arguments = sys.argv[1:]
+        while (len(arguments) > 0):
+            if ((len(arguments) < 2) or (not (arguments[0] in options))):
+                self.usage()
+                return
+            options[arguments[0]] = arguments[1]
+            arguments = arguments[2:]
+        runs = int(options["-n"])
+        files = {"font": options["-f"], "ebook": options["-e"]}
+
+        print("Command\tMedian (ms)\tMin (ms)\tIn process (ms)\tImports (ms)")
+        for label, command in self.COMMANDS:
+            arguments = []
+            skip = False
+            for a in command:
+                if (a in ["{font}", "{ebook}"]):
+                    a = files[a[1:-1]]
+                    skip = skip or (a == None)
+                arguments.append(a)
+            if (skip):
+                continue
+            wall, total, imports = self.benchmark(arguments, runs)
+            heavy = sorted([i for i in imports.items() if (i[1] >= self.IMPORT_THRESHOLD)], key=lambda x: -x[1])
+            print("%s\t%.1f\t%.1f\t%.1f\t%s" % (label, self.median(wall), min(wall), self.median(total), ", ".join(["%s %.1f" % i for i in heavy])))
+            if (options["-j"] != None):
+                f = open(options["-j"], "a")
+                f.write(json.dumps({
+                    "command": label,
+                    "arguments": arguments,
+                    "runs": runs,
+                    "median_ms": self.median(wall),
+                    "min_ms": min(wall),
+                    "in_process_ms": self.median(total),
+                    "imports_ms": imports
+                }) + "\n")
+                f.close()
+    ### END main ###
+
+
+if __name__ == '__main__':
+    b = benchStartup()
+    b.main()
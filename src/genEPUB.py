@@ -2,13 +2,16 @@
 
 __license__     = 'MIT'
 __author__      = 'Alberto Pettarin (alberto@albertopettarin.it)'
-__copyright__   = '2012-2014 Alberto Pettarin (alberto@albertopettarin.it)'
-__version__     = 'v2.0.1'
-__date__        = '2014-03-08'
+__copyright__   = '2012-2026 Alberto Pettarin (alberto@albertopettarin.it)'
+__version__     = 'v2.2.0'
+__date__        = '2026-10-16'
 __description__ = 'genEPUB creates an EPUB eBook from a list of Unicode characters'
 
 ### BEGIN changelog ###
 #
+# 2.2.0 2026-10-16 Optionally embed a specimen font, showing each character in it
+# 2.1.0 2026-10-16 Split the index into pages of at most pageSize characters (or per Unicode block)
+# 2.0.2 2026-10-16 Build the EPUB in memory, without a working directory
 # 2.0.1 2014-03-08 Fixed missing newlines in generated index.xhtml
 # 2.0.0 2014-03-07 Moved to GitHub, released under MIT license
 # 1.02  2013-03-16 Fixed usage message, added sort
@@ -16,10 +19,25 @@ __description__ = 'genEPUB creates an EPUB eBook from a list of Unicode characte
 #
 ### END changelog ###
 
-import codecs, os, shutil, sys, unicodedata, uuid, zipfile
+import codecs, os, sys, time, unicodedata, uuid, zipfile
 
 class genEPUB:
 
+    # default maximum number of characters in an index page,
+    # so that large character sets do not produce a single huge page
+    PAGE_SIZE = 1000
+
+    # font family of the embedded specimen font (see createEPUB)
+    SPECIMEN_FONT_FAMILY = "specimen"
+
+    # media types of the fonts which can be embedded, by extension
+    FONT_MEDIA_TYPES = {
+        ".otf": "application/vnd.ms-opentype",
+        ".ttf": "application/x-font-ttf",
+        ".woff": "application/font-woff",
+        ".woff2": "font/woff2"
+    }
+
     CONTROL_CHARATERS = dict([
             [0, "NUL '\\0'"],
             [1, "SOH (start of heading)"],
@@ -55,111 +73,125 @@ class genEPUB:
             [31, "US  (unit separator)"]])
 
     ### BEGIN createEPUB  ###
-    # createEPUB(characters, title, epubFilename)
+    # createEPUB(characters, title, epubFilename, sort, pageSize, getPageName)
     # creates the EPUB file epubFilename
-    # from the given list of characters
-    # with the given title
-    def createEPUB(self, characters, title, epubFilename):
+    # from the given list (or iterable) of characters
+    # with the given title;
+    # if sort is False, characters must be already sorted by codepoint,
+    # and they are consumed one at a time;
+    # the characters are split into index pages of at most pageSize characters
+    # (0 = no limit), and a new page is started whenever getPageName
+    # (if given, a function from codepoint to e.g. its Unicode block name) changes;
+    # specimen, if given, is a function returning [ font filename, font data ]
+    # (or None) of a font to embed, given the list of codepoints in the EPUB:
+    # if a font is embedded, each character is then shown also in that font,
+    # next to the default one (the characters are then read in memory first)
+    def createEPUB(self, characters, title, epubFilename, sort=True, pageSize=PAGE_SIZE, getPageName=None, specimen=None):
 
         # sort characters by codepoint
-        characters = sorted(characters)
+        if (sort):
+            characters = sorted(characters)
 
         # remove existing file
         if (os.path.exists(epubFilename)):
             os.remove(epubFilename)
 
-        # create tmp directory
-        tmpDir = "working"
-        if (os.path.exists(tmpDir)):
-            shutil.rmtree(tmpDir)
-        os.makedirs(tmpDir)
+        # every member is built in memory and written directly into the EPUB,
+        # so that no temporary files are used (and concurrent runs are safe)
+        fileEPUB = zipfile.ZipFile(epubFilename, "w", zipfile.ZIP_DEFLATED)
 
-        # create META-INF directory
-        metaInfDir = os.path.join(tmpDir, "META-INF")
-        os.makedirs(metaInfDir)
-
-        # create new mimetype file
-        mimetypeFile = os.path.join(tmpDir, "mimetype")
-        f = open(mimetypeFile, "w")
-        f.write("application/epub+zip")
-        f.close()
+        # mimetype must be the first member, and stored (not compressed)
+        mimetype = zipfile.ZipInfo("mimetype", time.localtime(time.time())[:6])
+        mimetype.compress_type = zipfile.ZIP_STORED
+        fileEPUB.writestr(mimetype, "application/epub+zip")
 
         # container file
         contentFileRelative = "content.opf"
-        contentFile = os.path.join(tmpDir, contentFileRelative)
-
-        # create new container.xml file
-        containerFile = os.path.join(metaInfDir, "container.xml")
-        f = open(containerFile, "w") 
-        f.write("<?xml version=\"1.0\"?>\n")
-        f.write("<container version=\"1.0\" xmlns=\"urn:oasis:names:tc:opendocument:xmlns:container\">\n")
-        f.write(" <rootfiles>\n")
-        f.write("  <rootfile full-path=\"%s\" media-type=\"application/oebps-package+xml\"/>\n" % contentFileRelative)
-        f.write(" </rootfiles>\n")
-        f.write("</container>")
-        f.close()
-
-        # create new style.css file
-        styleFile = os.path.join(tmpDir, "style.css")
-        f = open(styleFile, "w")
-        f.write("@charset \"UTF-8\";\n")
-        f.write("body {\n")
-        f.write("  margin: 10px 25px 10px 25px;\n")
-        f.write("}\n")  
-        f.write("h1 {\n")
-        f.write("  font-size: 200%;\n")
-        f.write("  text-align: left;\n")
-        f.write("}\n")
-        #f.write("body.index {\n")
-        #f.write("  margin: 10px 50px 10px 50px;\n")
-        #f.write("}\n")
-        f.write("table.character {\n")
-        f.write("  width: 96%;\n")
-        f.write("}\n")
-        f.write("th {\n")
-        f.write("  font-weight: bold;\n")
-        f.write("  text-align: left;\n")
-        f.write("}\n")
-        f.write("td {\n")
-        f.write("  text-align: left;\n")
-        f.write("  font-family: monospace;\n")
-        f.write("  font-size: 90%;\n")
-        f.write("}\n")
-        f.write(".character {\n")
-        f.write("  width: 96%;\n")
-        f.write("}\n")
-        f.write(".sym {\n")
-        f.write("  width: 10%;\n")
-        f.write("}\n")
-        f.write(".dec {\n")
-        f.write("  width: 10%;\n")
-        f.write("}\n")
-        f.write(".hex {\n")
-        f.write("  width: 10%;\n")
-        f.write("}\n")
-        f.write(".nam {\n")
-        f.write("  width: 70%;\n")
-        f.write("}\n")
-        f.close()
 
-        # create index file
-        self.outputIndexPage(characters, title, tmpDir)
+        # create container.xml file
+        sOUT = ""
+        sOUT += "<?xml version=\"1.0\"?>\n"
+        sOUT += "<container version=\"1.0\" xmlns=\"urn:oasis:names:tc:opendocument:xmlns:container\">\n"
+        sOUT += " <rootfiles>\n"
+        sOUT += "  <rootfile full-path=\"%s\" media-type=\"application/oebps-package+xml\"/>\n" % contentFileRelative
+        sOUT += " </rootfiles>\n"
+        sOUT += "</container>"
+        fileEPUB.writestr("META-INF/container.xml", sOUT)
+
+        # embed specimen font, before the index pages,
+        # which show the specimen column only if a font is embedded
+        fontFilename = None
+        if (specimen != None):
+            characters = list(characters)
+            font = specimen(characters)
+            if (font != None):
+                fontFilename = "fonts/%s" % (font[0])
+                fileEPUB.writestr(fontFilename, font[1])
+
+        # create index files
+        tocReferences = self.outputIndexPages(characters, title, fileEPUB, pageSize, getPageName, (fontFilename != None))
+
+        # create style.css file
+        sOUT = ""
+        sOUT += "@charset \"UTF-8\";\n"
+        sOUT += "body {\n"
+        sOUT += "  margin: 10px 25px 10px 25px;\n"
+        sOUT += "}\n"
+        sOUT += "h1 {\n"
+        sOUT += "  font-size: 200%;\n"
+        sOUT += "  text-align: left;\n"
+        sOUT += "}\n"
+        #sOUT += "body.index {\n"
+        #sOUT += "  margin: 10px 50px 10px 50px;\n"
+        #sOUT += "}\n"
+        sOUT += "table.character {\n"
+        sOUT += "  width: 96%;\n"
+        sOUT += "}\n"
+        sOUT += "th {\n"
+        sOUT += "  font-weight: bold;\n"
+        sOUT += "  text-align: left;\n"
+        sOUT += "}\n"
+        sOUT += "td {\n"
+        sOUT += "  text-align: left;\n"
+        sOUT += "  font-family: monospace;\n"
+        sOUT += "  font-size: 90%;\n"
+        sOUT += "}\n"
+        sOUT += ".character {\n"
+        sOUT += "  width: 96%;\n"
+        sOUT += "}\n"
+        sOUT += ".sym {\n"
+        sOUT += "  width: 10%;\n"
+        sOUT += "}\n"
+        sOUT += ".dec {\n"
+        sOUT += "  width: 10%;\n"
+        sOUT += "}\n"
+        sOUT += ".hex {\n"
+        sOUT += "  width: 10%;\n"
+        sOUT += "}\n"
+        sOUT += ".nam {\n"
+        sOUT += "  width: 70%;\n"
+        sOUT += "}\n"
+        if (fontFilename != None):
+            sOUT += ".spe {\n"
+            sOUT += "  width: 10%;\n"
+            sOUT += "  font-family: \"%s\";\n" % (self.SPECIMEN_FONT_FAMILY)
+            sOUT += "}\n"
+            sOUT += "@font-face {\n"
+            sOUT += "  font-family: \"%s\";\n" % (self.SPECIMEN_FONT_FAMILY)
+            sOUT += "  src: url(%s);\n" % (fontFilename)
+            sOUT += "}\n"
+        fileEPUB.writestr("style.css", sOUT)
 
         # get UUID
         identifier = str(uuid.uuid4()).lower()
 
         # create toc file
-        self.outputToc([["index.xhtml", title]], identifier, title, tmpDir)
+        self.outputToc(tocReferences, identifier, title, fileEPUB)
 
         # create opf file
-        self.outputOpf(identifier, title, tmpDir)
+        self.outputOpf(tocReferences, identifier, title, fileEPUB, fontFilename)
 
-        # zip epub
-        self.zipEPUB(epubFilename, tmpDir)
-
-        # delete tmp directory
-        if (os.path.exists(tmpDir)):
-            shutil.rmtree(tmpDir)
+        fileEPUB.close()
 
         return True
     ### END createEPUB ###
@@ -187,22 +219,6 @@ class genEPUB:
     ### END check_existence ###
 
 
-    ### BEGIN zipEPUB ###
-    # zipEPUB(self, filename, tmpDir) 
-    # zips directory into filename
-    def zipEPUB(self, filename, tmpDir):
-        # tmpDir = tmpDir + '/'
-        fileEPUB = zipfile.ZipFile(filename, 'w')
-        fileEPUB.write(os.path.join(tmpDir, 'mimetype'), 'mimetype', zipfile.ZIP_STORED)
-
-        structure = [ "META-INF/container.xml", "content.opf", "toc.ncx", "style.css", "index.xhtml" ]
-        for f in structure:
-            fileEPUB.write(os.path.join(tmpDir, f), f, zipfile.ZIP_DEFLATED)
-
-        fileEPUB.close()
-    ### END zipEPUB ###
-
-
     ### BEGIN readCharactersFromFile ###
     # readCharactersFromFile(listFilename)
     # reads the decimal Unicode codepoints from listFilename,
@@ -220,10 +236,84 @@ class genEPUB:
     ### END readCharactersFromFile ###
 
 
+    ### BEGIN outputIndexPages ###
+    # outputIndexPages(characters, title, fileEPUB, pageSize, getPageName, withSpecimen)
+    # create the index pages into fileEPUB, one page at a time,
+    # and return their [ reference, title ] pairs for the toc
+    def outputIndexPages(self, characters, title, fileEPUB, pageSize, getPageName, withSpecimen=False):
+        tocReferences = []
+        rows = []
+        pageName = None
+        first = None
+        last = None
+        for c in characters:
+            name = None
+            if (getPageName != None):
+                name = getPageName(c)
+            if ((len(rows) > 0) and (((pageSize > 0) and (len(rows) >= pageSize)) or (name != pageName))):
+                tocReferences.append(self.outputIndexPage(rows, title, self.getPageTitle(pageName, first, last), len(tocReferences) + 1, fileEPUB, withSpecimen))
+                rows = []
+            if (len(rows) == 0):
+                pageName = name
+                first = c
+            rows.append(self.getIndexRow(c, withSpecimen))
+            last = c
+
+        # the last page (the only one, possibly empty, if there are few characters)
+        if (len(rows) > 0):
+            tocReferences.append(self.outputIndexPage(rows, title, self.getPageTitle(pageName, first, last), len(tocReferences) + 1, fileEPUB, withSpecimen))
+        elif (len(tocReferences) == 0):
+            tocReferences.append(self.outputIndexPage(rows, title, title, 1, fileEPUB, withSpecimen))
+        return tocReferences
+    ### END outputIndexPages ###
+
+
+    ### BEGIN getPageTitle ###
+    # getPageTitle(pageName, first, last)
+    # return the title of the index page listing codepoints first to last
+    def getPageTitle(self, pageName, first, last):
+        codepoints = "U+%04X-U+%04X" % (first, last)
+        if (pageName == None):
+            return codepoints
+        return "%s (%s)" % (pageName, codepoints)
+    ### END getPageTitle ###
+
+
+    ### BEGIN getIndexRow ###
+    # getIndexRow(c, withSpecimen)
+    # return the table row of the index page for codepoint c
+    def getIndexRow(self, c, withSpecimen=False):
+        sOUT = ""
+        sOUT += "    <tr class=\"character\">\n"
+
+        # skip control characters
+        if (c < 32):
+            sOUT += "     <td class=\"sym\">%s</td>\n" % ("")
+            if (withSpecimen):
+                sOUT += "     <td class=\"spe\">%s</td>\n" % ("")
+            sOUT += "     <td class=\"dec\">%s</td>\n" % (str(c))
+            sOUT += "     <td class=\"hex\">%s</td>\n" % (str(hex(c)))
+            sOUT += "     <td class=\"nam\">%s</td>\n" % (self.CONTROL_CHARATERS[c])
+        else:
+            sOUT += "     <td class=\"sym\">%s</td>\n" % (self.escape(unichr(c)))
+            if (withSpecimen):
+                sOUT += "     <td class=\"spe\">%s</td>\n" % (self.escape(unichr(c)))
+            sOUT += "     <td class=\"dec\">%s</td>\n" % (str(c))
+            sOUT += "     <td class=\"hex\">%s</td>\n" % (str(hex(c)))
+            sOUT += "     <td class=\"nam\">%s</td>\n" % (unicodedata.name(unichr(c), "UNKNOWN NAME"))
+
+        sOUT += "    </tr>\n"
+        return sOUT
+    ### END getIndexRow ###
+
+
     ### BEGIN outputIndexPage ###
-    # outputIndexPage(characters, title, tmpDir)
-    # create the index page
-    def outputIndexPage(self, characters, title, tmpDir):
+    # outputIndexPage(rows, title, pageTitle, pageNumber, fileEPUB, withSpecimen)
+    # create the index page with the given table rows into fileEPUB,
+    # and return its [ reference, title ] pair for the toc
+    def outputIndexPage(self, rows, title, pageTitle, pageNumber, fileEPUB, withSpecimen=False):
+        reference = "index%04d.xhtml" % (pageNumber)
+
         sOUT = ""
         sOUT += "<?xml version=\"1.0\" encoding=\"utf-8\" standalone=\"no\"?>\n"
         sOUT += "<!DOCTYPE html PUBLIC \"-//W3C//DTD XHTML 1.1//EN\" \"http://www.w3.org/TR/xhtml11/DTD/xhtml11.dtd\">\n"
@@ -233,49 +323,42 @@ class genEPUB:
         sOUT += "  <link rel=\"stylesheet\" type=\"text/css\" href=\"style.css\" />\n"
         sOUT += " </head>\n"
         sOUT += " <body class=\"index\">\n"
-        sOUT += "  <h1>%s</h1>\n" % (self.escape(title))
+        if (pageNumber == 1):
+            sOUT += "  <h1>%s</h1>\n" % (self.escape(title))
+        if (pageTitle != title):
+            sOUT += "  <h2>%s</h2>\n" % (self.escape(pageTitle))
 
         # output char table
         sOUT += "   <table class=\"character\">\n"
         sOUT += "    <tr class=\"character\">\n"
         sOUT += "     <th class=\"sym\">%s</th>\n" % ("Sym")
+        if (withSpecimen):
+            sOUT += "     <th class=\"spe\">%s</th>\n" % ("Font")
         sOUT += "     <th class=\"dec\">%s</th>\n" % ("Dec")
         sOUT += "     <th class=\"hex\">%s</th>\n" % ("Hex")
         sOUT += "     <th class=\"nam\">%s</th>\n" % ("Unicode name")
         sOUT += "    </tr>\n"
-        for c in characters:
-            sOUT += "    <tr class=\"character\">\n"
-            
-            # skip control characters
-            if (c < 32):
-                sOUT += "     <td class=\"sym\">%s</td>\n" % ("")
-                sOUT += "     <td class=\"dec\">%s</td>\n" % (str(c))
-                sOUT += "     <td class=\"hex\">%s</td>\n" % (str(hex(c)))
-                sOUT += "     <td class=\"nam\">%s</td>\n" % (self.CONTROL_CHARATERS[c])
-            else:
-                sOUT += "     <td class=\"sym\">%s</td>\n" % (self.escape(unichr(c)))
-                sOUT += "     <td class=\"dec\">%s</td>\n" % (str(c))
-                sOUT += "     <td class=\"hex\">%s</td>\n" % (str(hex(c)))
-                sOUT += "     <td class=\"nam\">%s</td>\n" % (unicodedata.name(unichr(c), "UNKNOWN NAME"))
-            
-            sOUT += "    </tr>\n"
+
+        # rows are joined once, avoiding quadratic concatenation
+        page = [sOUT]
+        page.extend(rows)
+
+        sOUT = ""
         sOUT += "   </table>\n"
 
         sOUT += " </body>\n"
         sOUT += "</html>"
+        page.append(sOUT)
 
-        sOUT = sOUT.encode("utf-8")
-
-        fileOUT = open(os.path.join(tmpDir, "index.xhtml"), 'w')
-        fileOUT.write(sOUT)
-        fileOUT.close()
+        fileEPUB.writestr(reference, u"".join(page).encode("utf-8"))
+        return [reference, pageTitle]
     ### END outputIndexPage ###
 
 
     ### BEGIN createTOC ###
-    # outputToc(tocReferences, identifier, tmpDir) 
-    # create the toc.ncx file
-    def outputToc(self, tocReferences, identifier, title, tmpDir):
+    # outputToc(tocReferences, identifier, title, fileEPUB)
+    # create the toc.ncx file into fileEPUB
+    def outputToc(self, tocReferences, identifier, title, fileEPUB):
 
         sOUT = ""
         
@@ -311,18 +394,14 @@ class genEPUB:
         sOUT += " </navMap>\n"
         sOUT += "</ncx>"
              
-        sOUT = sOUT.encode("utf-8")
-        
-        fileOUT = open(os.path.join(tmpDir, "toc.ncx"), 'w')
-        fileOUT.write(sOUT)
-        fileOUT.close()
+        fileEPUB.writestr("toc.ncx", sOUT.encode("utf-8"))
     ### END createTOC ###
 
 
     ### BEGIN outputOpf ###
-    # outputOpf(identifier, title, tmpDir)
-    # create the content.opf file
-    def outputOpf(self, identifier, title, tmpDir):
+    # outputOpf(tocReferences, identifier, title, fileEPUB, fontFilename)
+    # create the content.opf file into fileEPUB
+    def outputOpf(self, tocReferences, identifier, title, fileEPUB, fontFilename=None):
         sOUT = ""
         sOUT += "<?xml version=\"1.0\" encoding=\"utf-8\" ?>\n"
         sOUT += "<package xmlns=\"http://www.idpf.org/2007/opf\" version=\"2.0\" unique-identifier=\"uuid_id\">\n"
@@ -337,19 +416,20 @@ class genEPUB:
         sOUT += " <manifest>\n"
         sOUT += "  <item href=\"style.css\" id=\"css\" media-type=\"text/css\" />\n"
         sOUT += "  <item href=\"toc.ncx\" id=\"ncx\" media-type=\"application/x-dtbncx+xml\" />\n"
-        sOUT += "  <item href=\"index.xhtml\" id=\"index.xhtml\" media-type=\"application/xhtml+xml\" />\n"
+        if (fontFilename != None):
+            mediaType = self.FONT_MEDIA_TYPES.get(os.path.splitext(fontFilename)[1].lower(), "application/octet-stream")
+            sOUT += "  <item href=\"%s\" id=\"font\" media-type=\"%s\" />\n" % (fontFilename, mediaType)
+        for f in tocReferences:
+            sOUT += "  <item href=\"%s\" id=\"%s\" media-type=\"application/xhtml+xml\" />\n" % (f[0], f[0])
         sOUT += " </manifest>\n"
         
         sOUT += " <spine toc=\"ncx\">\n"
-        sOUT += "  <itemref idref=\"index.xhtml\" />\n"
+        for f in tocReferences:
+            sOUT += "  <itemref idref=\"%s\" />\n" % (f[0])
         sOUT += " </spine>\n"
         sOUT += "</package>"
 
-        sOUT = sOUT.encode("utf-8")
-
-        fileOUT = open(os.path.join(tmpDir, "content.opf"), 'w')
-        fileOUT.write(sOUT)
-        fileOUT.close()
+        fileEPUB.writestr("content.opf", sOUT.encode("utf-8"))
     ### END outputOpf ###
 
 
@@ -358,12 +438,15 @@ class genEPUB:
     # print script usage
     def usage(self):
         print("")
-        print("$ python genEPUB.py characters title")
+        print("$ python genEPUB.py characters title [pageSize]")
         print("")
         print("Required argument:")
         print(" characters: the name of a UTF-8 plain text file containing the list of decimal Unicode codepoints, one per line")
         print(" title: string to be used as title for the EPUB")
         print("")
+        print("Optional argument:")
+        print(" pageSize: maximum number of characters in each page of the EPUB, 0 for a single page (default: %d)" % (self.PAGE_SIZE))
+        print("")
         print("Examples:")
         print(" $ python genEPUB.py char.lst \"My Unicode char list\"")
         print("   Create an EPUB file char.lst.epub containing the given list of decimal Unicode codepoints, entitled 'My Unicode char list'")
@@ -378,10 +461,14 @@ class genEPUB:
             listFilename = sys.argv[1]
             title = sys.argv[2]
 
+            pageSize = self.PAGE_SIZE
+            if (len(sys.argv) > 3):
+                pageSize = int(sys.argv[3])
+
             if (self.check_existence(listFilename)):
                 epubFilename = listFilename + ".epub"
                 characters = self.readCharactersFromFile(listFilename)
-                self.createEPUB(characters, title, epubFilename)
+                self.createEPUB(characters, title, epubFilename, pageSize=pageSize)
             else:
                 self.usage()
         else:
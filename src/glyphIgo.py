@@ -4,14 +4,15 @@
 
 __license__     = 'MIT'
 __author__      = 'Alberto Pettarin (alberto@albertopettarin.it)'
-__copyright__   = '2012-2015 Alberto Pettarin (alberto@albertopettarin.it)'
-__version__     = 'v3.0.3'
-__date__        = '2015-06-07'
+__copyright__   = '2012-2026 Alberto Pettarin (alberto@albertopettarin.it)'
+__version__     = 'v3.1.0'
+__date__        = '2026-10-16'
 __description__ = 'glyphIgo is a Swiss Army knife for dealing with fonts and EPUB eBooks'
 
 
 ### BEGIN changelog ###
 #
+# 3.1.0 2026-10-16 Added batch check/subset, subset plans, font stacks, serve, --jobs, --format, --manifest, --documents, --specimen
 # 3.0.3 2015-06-07 Added option to remove the char set while subsetting a font
 # 3.0.2 2014-10-19 Support for bash/zsh autocompletion via argcomplete
 # 3.0.1 2014-10-08 Better hex/dec char lookup, added range option to list command
@@ -46,52 +47,68 @@ __description__ = 'glyphIgo is a Swiss Army knife for dealing with fonts and EPU
 
 
 
-try:
-    import argcomplete
-except ImportError:
-    pass 
-
+# modules needed only by some commands (e.g., fontforge, numpy, zipfile)
+# are imported inside the functions using them, so that each command
+# pays only for the modules it actually uses at startup
 import argparse
+import bisect
 import codecs
 import collections
-import fontforge
-import hashlib
-import htmlentitydefs
+import HTMLParser
+import itertools
 import os
 import re
+import struct
 import sys
+import time
 import unicodedata
-import zipfile
+
+# helper: import the optional module with the given name on first use,
+# returning None if it is not installed
+OPTIONAL_MODULES = {}
+def import_optional(name):
+    if (not (name in OPTIONAL_MODULES)):
+        try:
+            OPTIONAL_MODULES[name] = __import__(name)
+        except ImportError:
+            OPTIONAL_MODULES[name] = None
+    return OPTIONAL_MODULES[name]
 
 
 class CustomParser:
     
+    COMMAND_CACHE = "cache"
     COMMAND_CHECK = "check"
     COMMAND_CONVERT = "convert"
     COMMAND_COUNT = "count"
     COMMAND_LIST = "list"
     COMMAND_LOOKUP = "lookup"
     COMMAND_OBFUSCATE = "obfuscate"
+    COMMAND_SERVE = "serve"
     COMMAND_SUBSET = "subset"
     COMMAND_ALL = [
+        COMMAND_CACHE,
         COMMAND_CHECK,
         COMMAND_CONVERT,
         COMMAND_COUNT,
         COMMAND_LIST,
         COMMAND_LOOKUP,
         COMMAND_OBFUSCATE,
+        COMMAND_SERVE,
         COMMAND_SUBSET
     ]
     COMMAND_DEFAULT = COMMAND_LIST 
     
     COMMAND_REQUIRED_PARAMETERS = {
-        COMMAND_CHECK: [ ["ebook", "plain"], ["font", "glyphs"] ],
+        COMMAND_CACHE: [],
+        COMMAND_CHECK: [ ["batch", "ebook", "plain"], ["font", "glyphs"] ],
         COMMAND_CONVERT: [ ["font"], ["output"] ],
-        COMMAND_COUNT: [ ["ebook", "plain"] ],
-        COMMAND_LIST: [ ["blocks", "ebook", "font", "glyphs", "plain", "range"] ],
+        COMMAND_COUNT: [ ["batch", "ebook", "plain"] ],
+        COMMAND_LIST: [ ["batch", "blocks", "ebook", "font", "glyphs", "plain", "range"] ],
         COMMAND_LOOKUP: [ ["character"] ],
-        COMMAND_OBFUSCATE: [ ["font"], ["id"] ],
-        COMMAND_SUBSET: [ ["ebook", "plain"], ["font"] ]
+        COMMAND_OBFUSCATE: [ ["ebook", "font"] ],
+        COMMAND_SERVE: [ ["port", "socket"] ],
+        COMMAND_SUBSET: [ ["batch", "ebook", "plain"], ["font"] ]
     } 
     
     DESCRIPTION = __description__
@@ -117,6 +134,26 @@ class CustomParser:
             "msg": "As above, but also create missing.epub containing the list of missing Unicode characters",
             "cmd": ["check -f font.ttf -e ebook.epub -u -o missing.epub"]
         },
+        {
+            "msg": "As above, but group missing characters (if any) by Unicode block",
+            "cmd": ["check -f font.ttf -e ebook.epub --group"]
+        },
+        {
+            "msg": "Check ebook.epub against the fallback stack body.ttf, symbol.ttf, cjk.otf, printing the characters rendered by each font and those rendered by none",
+            "cmd": ["check -f body.ttf -f symbol.ttf -f cjk.otf -e ebook.epub"]
+        },
+        {
+            "msg": "Check the unpacked ebook in directory src/ against font.ttf, re-reading only the pages changed since the previous run with the same manifest.json",
+            "cmd": ["check -f font.ttf -e src/ --manifest manifest.json"]
+        },
+        {
+            "msg": "Check all the ebooks listed in manifest.txt (or contained in directory ebooks/) against font1.ttf and font2.ttf, printing one JSON line for each ebook/font pair",
+            "cmd": ["check -b manifest.txt -f font1.ttf -f font2.ttf", "check -b ebooks/ -f font1.ttf -f font2.ttf"]
+        },
+        {
+            "msg": "As above, but read the ebooks using 8 worker processes",
+            "cmd": ["check -b manifest.txt -f font1.ttf -f font2.ttf -j 8"]
+        },
         {
             "msg": "Convert font.ttf (TTF) into font.otf (OTF)",
             "cmd": ["convert -f font.ttf -o font.otf"]
@@ -137,6 +174,10 @@ class CustomParser:
             "msg": "As above, but just output the decimal codepoints",
             "cmd": ["list -f font.ttf -q"]
         },
+        {
+            "msg": "Print the list of glyphs in font.ttf which are not used in ebook.epub",
+            "cmd": ["list -f font.ttf -e ebook.epub --exclude"]
+        },
         {
             "msg": "Print the list of characters in ebook.epub",
             "cmd": ["list -e ebook.epub"]
@@ -145,6 +186,18 @@ class CustomParser:
             "msg": "As above, but also create list.epub containing the list of Unicode characters",
             "cmd": ["list -e ebook.epub -u -o list.epub"]
         },
+        {
+            "msg": "As above, but read the members of ebook.epub using 4 worker processes",
+            "cmd": ["list -e ebook.epub -j 4"]
+        },
+        {
+            "msg": "Print the list of characters in ebook.epub as JSON Lines (or TSV, or CSV), one row for each character, with its Unicode block",
+            "cmd": ["list -e ebook.epub --format jsonl", "list -e ebook.epub --format tsv", "list -e ebook.epub --format csv"]
+        },
+        {
+            "msg": "Print the list of characters in all the ebooks contained in directory ebooks/",
+            "cmd": ["list -b ebooks/"]
+        },
         {
             "msg": "Print the list of characters in page.xhtml",
             "cmd": ["list -p page.xhtml"]
@@ -153,10 +206,26 @@ class CustomParser:
             "msg": "Print the list of characters in the range 0x2200-0x22ff (Mathematical Operators)",
             "cmd": ["list -r 0x2200-0x22ff", "list -r \"Mathematical Operators\""]
         },
+        {
+            "msg": "Print the list of characters in the ranges 0x2190-0x21ff (Arrows) and 0x2200-0x22ff (Mathematical Operators) and in the Unicode block Box Drawing",
+            "cmd": ["list -r \"0x2190-0x21ff,0x2200-0x22ff,Box Drawing\""]
+        },
         {
             "msg": "Print the range and name of Unicode blocks",
             "cmd": ["list --blocks"]
         },
+        {
+            "msg": "Store the list of glyphs in font1.ttf and font2.ttf in the font cache (~/.cache/glyphIgo), used by check, list, and subset",
+            "cmd": ["cache -f font1.ttf -f font2.ttf"]
+        },
+        {
+            "msg": "Print the fonts in the font cache",
+            "cmd": ["cache"]
+        },
+        {
+            "msg": "Delete all the entries in the font cache",
+            "cmd": ["cache --purge"]
+        },
         {
             "msg": "Lookup for information for Unicode character",
             "cmd": ["lookup -c 8253", "lookup -c 0x203d", "lookup -c ‽", "lookup -c \"INTERROBANG\""]
@@ -177,6 +246,14 @@ class CustomParser:
             "msg": "As above, but use Adobe algorithm",
             "cmd": ["obfuscate -f font.otf -i \"urn:uuid:9a0ca9ab-9e33-4181-b2a3-e7f2ceb8e9bd\" -o obf.font.otf --adobe"]
         },
+        {
+            "msg": "Obfuscate the fonts in ebook.epub, in place, using its unique identifier and the IDPF algorithm, and list them in META-INF/encryption.xml",
+            "cmd": ["obfuscate -e ebook.epub"]
+        },
+        {
+            "msg": "Deobfuscate the fonts listed in META-INF/encryption.xml of ebook.epub into plain.epub",
+            "cmd": ["obfuscate -e ebook.epub --deobfuscate -o plain.epub"]
+        },
         {
             "msg": "Subset font.ttf into min.font.otf by copying only the glyphs appearing in ebook.epub",
             "cmd": ["subset -f font.ttf -e ebook.epub -o min.font.otf"]
@@ -185,6 +262,38 @@ class CustomParser:
             "msg": "Subset font.ttf into rem.font.ttf by removing the glyphs appearing in list.txt",
             "cmd": ["subset -f font.ttf -p list.txt -o rem.font.ttf --exclude"]
         },
+        {
+            "msg": "Subset font1.ttf and font2.ttf for each ebook listed in manifest.txt, writing book.font1.ttf and book.font2.ttf for book.epub into directory subsets/, using 4 worker processes",
+            "cmd": ["subset -b manifest.txt -f font1.ttf -f font2.ttf -o subsets/ -j 4"]
+        },
+        {
+            "msg": "Plan the subsets of font.ttf for the ebooks in directory series/, reporting the size of one subset per ebook and of one shared subset",
+            "cmd": ["subset -b series/ -f font.ttf --plan"]
+        },
+        {
+            "msg": "As above, but also cluster the ebooks into subsets of at most 60000 bytes, and generate them into directory subsets/",
+            "cmd": ["subset -b series/ -f font.ttf --plan --budget 60000 -o subsets/"]
+        },
+        {
+            "msg": "Serve check, count, list, and lookup requests over the Unix socket /tmp/glyphIgo.sock (or over HTTP on 127.0.0.1:8373), keeping fonts and indices in memory; see glyphIgoClient.py",
+            "cmd": ["serve --socket /tmp/glyphIgo.sock", "serve --port 8373"]
+        },
+        {
+            "msg": "Create list.epub containing the glyphs in font.ttf, with one page per Unicode block and at most 500 characters per page",
+            "cmd": ["list -f font.ttf -u -o list.epub --page-size 500"]
+        },
+        {
+            "msg": "As above, but embed in list.epub a subset of font.ttf, showing each glyph also in font.ttf",
+            "cmd": ["list -f font.ttf -u -o list.epub --page-size 500 --specimen"]
+        },
+        {
+            "msg": "List the characters in ebook.epub, also reading its table of contents (NCX and nav document) and its metadata (OPF)",
+            "cmd": ["list -e ebook.epub --navigation"]
+        },
+        {
+            "msg": "Print one JSON line for each document of ebook.epub, in reading order, with its number of characters (or its histogram), and the characters appearing in it for the first time",
+            "cmd": ["count -e ebook.epub --documents", "list -e ebook.epub --documents"]
+        },
         {
             "msg": "",
             "cmd": [""]
@@ -220,6 +329,12 @@ class CustomParser:
     ]
 
     OPTIONAL_PARAMETERS = [
+        {
+            "short": "-b",
+            "long": "--batch",
+            "help": "batch of ebook files, in EPUB/ZIP format, specified as a plain text file BATCH containing one path per line or as a directory BATCH",
+            "action": "store"
+        },
         {
             "short": "-c",
             "long": "--character",
@@ -235,14 +350,14 @@ class CustomParser:
         {
             "short": "-e",
             "long": "--ebook",
-            "help": "ebook file, in EPUB/ZIP format",
+            "help": "ebook file, in EPUB/ZIP format, or directory containing an unpacked ebook",
             "action": "store"
         },
         {
             "short": "-f",
             "long": "--font",
-            "help": "font file, in TTF/OTF/WOFF format",
-            "action": "store"
+            "help": "font file, in TTF/OTF/WOFF format (can be repeated with BATCH, or to check a fallback stack of fonts, in priority order)",
+            "action": "append"
         },
         {
             "short": "-g",
@@ -253,7 +368,13 @@ class CustomParser:
         {
             "short": "-i",
             "long": "--id",
-            "help": "(de)obfuscate FONT using ID to compute the obfuscation key",
+            "help": "(de)obfuscate FONT using ID to compute the obfuscation key (default for EBOOK: its unique identifier)",
+            "action": "store"
+        },
+        {
+            "short": "-j",
+            "long": "--jobs",
+            "help": "read ebooks using JOBS worker processes (default: 1)",
             "action": "store"
         },
         {
@@ -271,7 +392,7 @@ class CustomParser:
         {
             "short": "-r",
             "long": "--range",
-            "help": "range, in '0x????-0x????' or '????-????' format",
+            "help": "range, in '0x????-0x????' or '????-????' format, or Unicode block name; several ranges and block names can be separated by commas",
             "action": "store"
         },
         {
@@ -316,12 +437,36 @@ class CustomParser:
             "help": "print range and name of Unicode blocks",
             "action": "store_true"
         },
+        {
+            "short": None,
+            "long": "--budget",
+            "help": "with --plan, cluster the ebooks so that each subset is at most BUDGET bytes",
+            "action": "store"
+        },
         {
             "short": None,
             "long": "--compact",
             "help": "compact lookup output (Unicode character, name, and codepoint only)",
             "action": "store_true"
         },
+        {
+            "short": None,
+            "long": "--deobfuscate",
+            "help": "deobfuscate the fonts listed in META-INF/encryption.xml of EBOOK, instead of obfuscating the fonts in its manifest",
+            "action": "store_true"
+        },
+        {
+            "short": None,
+            "long": "--documents",
+            "help": "print one JSON line for each document of EBOOK (e.g., each spine item), in reading order, with its number of characters (count) or its histogram (list), and the characters appearing in it for the first time",
+            "action": "store_true"
+        },
+        {
+            "short": None,
+            "long": "--encoding",
+            "help": "encode the list of characters with ENCODING (default: utf-8)",
+            "action": "store"
+        },
         {
             "short": None,
             "long": "--exact",
@@ -334,12 +479,25 @@ class CustomParser:
             "help": "exclude the characters in EBOOK or PLAIN from the output",
             "action": "store_true"
         },
+        {
+            "short": None,
+            "long": "--format",
+            "help": "print the list of characters as FORMAT: text (default), or one row per character with fields character, codepoint, hex, name, block, count as tsv, jsonl (JSON Lines) or csv; [INFO] messages are not printed with tsv, jsonl, or csv",
+            "action": "store",
+            "choices": ["text", "tsv", "jsonl", "csv"]
+        },
         {
             "short": None,
             "long": "--full",
             "help": "full lookup output (default)",
             "action": "store_true"
         },
+        {
+            "short": None,
+            "long": "--group",
+            "help": "group output characters by Unicode block",
+            "action": "store_true"
+        },
         {
             "short": None,
             "long": "--heuristic",
@@ -352,21 +510,83 @@ class CustomParser:
             "help": "use IDPF obfuscation algorithm (default)",
             "action": "store_true"
         },
+        {
+            "short": None,
+            "long": "--manifest",
+            "help": "keep the character histogram of each X(HT)ML member of EBOOK in MANIFEST (JSON), re-reading only the members changed since the previous run",
+            "action": "store"
+        },
+        {
+            "short": None,
+            "long": "--navigation",
+            "help": "also count the characters in the table of contents (NCX and nav document) and in the metadata (OPF) of EPUB ebooks",
+            "action": "store_true"
+        },
+        {
+            "short": None,
+            "long": "--nocache",
+            "help": "do not use the font cache",
+            "action": "store_true"
+        },
+        {
+            "short": None,
+            "long": "--page-size",
+            "help": "with --epub, split the EPUB into one page per Unicode block, with at most PAGE_SIZE characters per page (default: 1000; 0 = no limit)",
+            "action": "store"
+        },
+        {
+            "short": None,
+            "long": "--plan",
+            "help": "plan the subsets of FONT for the ebooks in BATCH, reporting their overlap and the size of one subset per ebook, of one shared subset, or of clustered subsets (see --budget)",
+            "action": "store_true"
+        },
+        {
+            "short": None,
+            "long": "--port",
+            "help": "serve requests over HTTP on 127.0.0.1:PORT",
+            "action": "store"
+        },
         {
             "short": None,
             "long": "--preserve",
             "help": "preserve X(HT)ML tags instead of stripping them away",
             "action": "store_true"
+        },
+        {
+            "short": None,
+            "long": "--purge",
+            "help": "delete all the entries in the font cache",
+            "action": "store_true"
+        },
+        {
+            "short": None,
+            "long": "--specimen",
+            "help": "with list and --epub, embed in the EPUB a subset of FONT with the listed characters, showing each of them also in FONT",
+            "action": "store_true"
+        },
+        {
+            "short": None,
+            "long": "--socket",
+            "help": "serve requests over the Unix socket SOCKET",
+            "action": "store"
         }
     ]
 
     OPTIONAL_PARAMETERS_CONFLICTS = [
-        [ "blocks", "character", "ebook", "plain", "range" ],
+        [ "batch", "blocks", "character", "ebook", "plain", "range" ],
         [ "blocks", "character", "font", "glyphs", "range" ],
+        [ "batch", "epub" ],
+        [ "batch", "manifest" ],
+        [ "documents", "epub" ],
+        [ "documents", "format" ],
         [ "quiet", "verbose", "nohumanreadable" ],
         [ "adobe", "idpf" ],
+        [ "adobe", "deobfuscate" ],
+        [ "deobfuscate", "font" ],
         [ "compact", "full" ],
-        [ "exact", "heuristic" ]
+        [ "exact", "heuristic" ],
+        [ "nocache", "purge" ],
+        [ "port", "socket" ]
     ]
 
     VERSION = __version__
@@ -383,7 +603,63 @@ class CustomParser:
             if (count > 1):
                 msg = "Conflicting optional arguments: %s\n" % (str(found))
                 return False, msg
+
+        # JOBS must be a positive integer
+        if (("jobs" in args) and ((not re.match(r"^[0-9]+$", args.jobs)) or (int(args.jobs) < 1))):
+            msg = "Option '--jobs' must be a positive integer\n"
+            return False, msg
+
+        # PORT must be a positive integer
+        if (("port" in args) and ((not re.match(r"^[0-9]+$", args.port)) or (int(args.port) < 1) or (int(args.port) > 65535))):
+            msg = "Option '--port' must be an integer between 1 and 65535\n"
+            return False, msg
+
+        # PAGE_SIZE must be a non-negative integer
+        if (("page_size" in args) and (not re.match(r"^[0-9]+$", args.page_size))):
+            msg = "Option '--page-size' must be a non-negative integer\n"
+            return False, msg
+        if (("page_size" in args) and (not ("epub" in args))):
+            msg = "Option '--page-size' can be used only with option '--epub'\n"
+            return False, msg
+
+        # document statistics are computed for a single ebook
+        if (("documents" in args) and ((not (args.command in [self.COMMAND_COUNT, self.COMMAND_LIST])) or (not ("ebook" in args)) or ("font" in args) or ("glyphs" in args))):
+            msg = "Option '--documents' can be used only with commands '%s' and '%s' and option '--ebook' alone\n" % (self.COMMAND_COUNT, self.COMMAND_LIST)
+            return False, msg
+
+        # a specimen is a subset of a single font with the listed characters
+        # (check would list only characters missing from the font)
+        if (("specimen" in args) and ((args.command != self.COMMAND_LIST) or (not ("epub" in args)) or (not ("font" in args)) or (len(args.font) > 1))):
+            msg = "Option '--specimen' can be used only with command '%s', option '--epub', and a single '--font'\n" % (self.COMMAND_LIST)
+            return False, msg
+
+        # BUDGET must be a positive integer
+        if (("budget" in args) and ((not re.match(r"^[0-9]+$", args.budget)) or (int(args.budget) < 1))):
+            msg = "Option '--budget' must be a positive integer\n"
+            return False, msg
+
+        # a plan is made for a batch of ebooks and a single font
+        if (("plan" in args) and ((args.command != self.COMMAND_SUBSET) or (not ("batch" in args)) or (not ("font" in args)) or (len(args.font) > 1))):
+            msg = "Option '--plan' can be used only with command '%s', option '--batch', and a single '--font'\n" % (self.COMMAND_SUBSET)
+            return False, msg
+        if (("budget" in args) and (not ("plan" in args))):
+            msg = "Option '--budget' can be used only with option '--plan'\n"
+            return False, msg
+
+        # multiple fonts can be given only for a batch, as a fallback stack to check, or to the cache
+        if (("font" in args) and (len(args.font) > 1) and (not ("batch" in args)) and (not (args.command in [self.COMMAND_CACHE, self.COMMAND_CHECK]))):
+            msg = "Option '--font' can be repeated only with option '--batch' or commands '%s' and '%s'\n" % (self.COMMAND_CACHE, self.COMMAND_CHECK)
+            return False, msg
         
+        # obfuscate works either on a loose font, which has no OPF to read the id from, or on an ebook
+        if ((args.command == self.COMMAND_OBFUSCATE) and ("font" in args)):
+            if ("ebook" in args):
+                msg = "After command '%s' you must specify only one of '--ebook' or '--font'\n" % (args.command)
+                return False, msg
+            if (not ("id" in args)):
+                msg = "After command '%s' with option '--font' you must specify '--id'\n" % (args.command)
+                return False, msg
+
         # check arguments required by the given command 
         for condition in self.COMMAND_REQUIRED_PARAMETERS[args.command]:
             found = False
@@ -419,6 +695,7 @@ class CustomParser:
             description = c["description"]
             n = trailing_characters + " " * (tot - len(value))
             s += n + value + value_separator + description + "\n"
+        s += trailing_characters + "with --batch, the codes of all the (ebook, font) pairs are combined bitwise (e.g., 12 = 4 + 8)\n"
         return s
 
     def __get_examples_string(self):
@@ -452,7 +729,8 @@ class CustomParser:
     def __get_version(self):
         return self.VERSION
 
-    def get_arguments(self):
+    # parse the given arguments (by default, the command line ones)
+    def get_arguments(self, argv=None):
         program_usage = self.__get_usage()
         program_description = self.__get_description_string()
         program_epilog = self.__get_exit_codes_string() + "\n" + self.__get_examples_string()
@@ -478,30 +756,36 @@ class CustomParser:
                 version=self.__get_version())
 
         for param in self.__get_optional_parameters():
+            kwargs = {}
+            if ("choices" in param):
+                kwargs["choices"] = param["choices"]
             if (param["short"]):
                 parser.add_argument(
                     param["short"],
                     param["long"],
                     help=param["help"],
                     action=param["action"],
-                    default=argparse.SUPPRESS
+                    default=argparse.SUPPRESS,
+                    **kwargs
                 )
             elif (param["long"]):
                 parser.add_argument(
                     param["long"],
                     help=param["help"],
                     action=param["action"],
-                    default=argparse.SUPPRESS
+                    default=argparse.SUPPRESS,
+                    **kwargs
                 )
 
-        # try using argcomplete
-        try:
-            argcomplete.autocomplete(parser)
-        except:
-            pass 
+        # try using argcomplete (only when invoked for completion)
+        if ("_ARGCOMPLETE" in os.environ):
+            try:
+                import_optional("argcomplete").autocomplete(parser)
+            except:
+                pass 
        
         # parse arguments
-        args = parser.parse_args()
+        args = parser.parse_args(argv)
         
         # standard ArgumentParser checker is cumbersome and limited
         isOK, msg = self.__check_arguments(args)
@@ -513,8 +797,1580 @@ class CustomParser:
 
 
 
+class CodepointSet:
+
+    # a set of Unicode codepoints (0..0x10FFFF), stored as a sorted list
+    # of run boundaries [start_0, stop_0, start_1, stop_1, ...],
+    # where each run [start_i, stop_i) contains consecutive codepoints,
+    # so that membership is a bisect and union, intersection and
+    # difference are linear merges of the two boundary lists
+
+    __bounds = None
+
+    def __init__(self, codepoints=None):
+        self.__bounds = []
+        if (codepoints != None):
+            for c in sorted(set(codepoints)):
+                if ((len(self.__bounds) > 0) and (self.__bounds[-1] == c)):
+                    self.__bounds[-1] = c + 1
+                else:
+                    self.__bounds.append(c)
+                    self.__bounds.append(c + 1)
+
+    # create a set from a list of [start, stop] runs, stop included
+    @classmethod
+    def from_ranges(cls, ranges):
+        bounds = []
+        for r in sorted(ranges):
+            if ((len(bounds) > 0) and (r[0] <= bounds[-1])):
+                bounds[-1] = max(bounds[-1], r[1] + 1)
+            else:
+                bounds.append(r[0])
+                bounds.append(r[1] + 1)
+        return cls.__from_bounds(bounds)
+
+    @classmethod
+    def __from_bounds(cls, bounds):
+        result = cls()
+        result.__bounds = bounds
+        return result
+
+    def __contains__(self, codepoint):
+        return ((bisect.bisect_right(self.__bounds, codepoint) % 2) == 1)
+
+    def __iter__(self):
+        for i in range(0, len(self.__bounds), 2):
+            for c in xrange(self.__bounds[i], self.__bounds[i + 1]):
+                yield c
+
+    def __len__(self):
+        total = 0
+        for i in range(0, len(self.__bounds), 2):
+            total += self.__bounds[i + 1] - self.__bounds[i]
+        return total
+
+    # return the list of [start, stop] runs, stop included
+    def get_ranges(self):
+        ranges = []
+        for i in range(0, len(self.__bounds), 2):
+            ranges.append([self.__bounds[i], self.__bounds[i + 1] - 1])
+        return ranges
+
+    def union(self, other):
+        return self.__combine(other, lambda a, b: a or b)
+
+    def intersection(self, other):
+        return self.__combine(other, lambda a, b: a and b)
+
+    def difference(self, other):
+        return self.__combine(other, lambda a, b: a and (not b))
+
+    # helper: sweep the boundaries of both sets in order,
+    # emitting a boundary whenever the value of op changes
+    def __combine(self, other, op):
+        a = self.__bounds
+        b = other.__bounds
+        bounds = []
+        i = 0
+        j = 0
+        in_a = False
+        in_b = False
+        inside = False
+        while ((i < len(a)) or (j < len(b))):
+            if ((j >= len(b)) or ((i < len(a)) and (a[i] < b[j]))):
+                point = a[i]
+            else:
+                point = b[j]
+            while ((i < len(a)) and (a[i] == point)):
+                in_a = not in_a
+                i += 1
+            while ((j < len(b)) and (b[j] == point)):
+                in_b = not in_b
+                j += 1
+            now_inside = op(in_a, in_b)
+            if (now_inside != inside):
+                bounds.append(point)
+                inside = now_inside
+        return self.__from_bounds(bounds)
+
+
+class FontStack:
+
+    # an ordered list of fonts (a fallback stack), given as CodepointSet objects,
+    # combined into a single sorted list of run boundaries,
+    # each run labelled with the position of the first font covering it,
+    # so that the font rendering a codepoint is found with one bisect,
+    # whatever the number of fonts
+
+    __bounds = None
+    __owners = None
+
+    def __init__(self, codepoint_sets):
+        runs = []
+        covered = CodepointSet()
+        for i in range(len(codepoint_sets)):
+            for start, stop in codepoint_sets[i].difference(covered).get_ranges():
+                runs.append([start, stop, i])
+            covered = covered.union(codepoint_sets[i])
+        runs.sort()
+        self.__bounds = []
+        self.__owners = []
+        for start, stop, i in runs:
+            self.__bounds.append(start)
+            self.__bounds.append(stop + 1)
+            self.__owners.append(i)
+
+    # return the position of the first font covering codepoint, or -1
+    def get_font(self, codepoint):
+        i = bisect.bisect_right(self.__bounds, codepoint)
+        if ((i % 2) == 1):
+            return self.__owners[i // 2]
+        return -1
+
+# helper: get the directory where glyphIgo caches data between runs
+def get_cache_directory():
+    cache_home = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(cache_home, "glyphIgo")
+
+class CmapReader:
+
+    # read the codepoints mapped by the cmap table of a font file,
+    # in TTF/OTF (or TTC, first font only), WOFF or WOFF2 format,
+    # without loading the rest of the font:
+    # all the Unicode subtables (platform 0, and platform 3 encodings 1 and 10)
+    # in format 0, 4, 6, 12 or 13 are merged,
+    # falling back to the Windows Symbol subtable (platform 3 encoding 0)
+    # if the font has no Unicode subtable;
+    # codepoints mapped to glyph 0 (.notdef) are ignored
+
+    # tags of the WOFF2 known tables, see the WOFF2 specification
+    WOFF2_KNOWN_TAGS = [
+        "cmap", "head", "hhea", "hmtx", "maxp", "name", "OS/2", "post",
+        "cvt ", "fpgm", "glyf", "loca", "prep", "CFF ", "VORG", "EBDT",
+        "EBLC", "gasp", "hdmx", "kern", "LTSH", "PCLT", "VDMX", "vhea",
+        "vmtx", "BASE", "GDEF", "GPOS", "GSUB", "EBSC", "JSTF", "MATH",
+        "CBDT", "CBLC", "COLR", "CPAL", "SVG ", "sbix", "acnt", "avar",
+        "bdat", "bloc", "bsln", "cvar", "fdsc", "feat", "fmtx", "fvar",
+        "gvar", "hsty", "just", "lcar", "mort", "morx", "opbd", "prop",
+        "trak", "Zapf", "Silf", "Glat", "Gloc", "Feat", "Sill"
+    ]
+
+    UNICODE_ENCODINGS = [ (0, None), (3, 1), (3, 10) ]
+    SYMBOL_ENCODINGS = [ (3, 0) ]
+
+    __data = None
+
+    def __init__(self, font_file):
+        f = open(font_file, "rb")
+        self.__data = f.read()
+        f.close()
+
+    def get_codepoint_set(self):
+        cmap = self.__get_cmap_table()
+        version, num_tables = struct.unpack_from(">HH", cmap, 0)
+        subtables = []
+        for i in range(num_tables):
+            platform_id, encoding_id, offset = struct.unpack_from(">HHL", cmap, 4 + 8 * i)
+            subtables.append([platform_id, encoding_id, offset])
+        for encodings in [ self.UNICODE_ENCODINGS, self.SYMBOL_ENCODINGS ]:
+            ranges = []
+            found = False
+            for platform_id, encoding_id, offset in subtables:
+                if (((platform_id, encoding_id) in encodings) or ((platform_id, None) in encodings)):
+                    subtable_ranges = self.__get_subtable_ranges(cmap, offset)
+                    if (subtable_ranges != None):
+                        ranges += subtable_ranges
+                        found = True
+            if (found):
+                return CodepointSet.from_ranges(ranges)
+        raise Exception("No supported cmap subtable found")
+
+    # return the number of glyphs of the font, from its maxp table
+    def get_num_glyphs(self):
+        return struct.unpack_from(">H", self.__get_table("maxp"), 4)[0]
+
+    # return a dictionary from table tag to (uncompressed) table length
+    def get_table_lengths(self):
+        lengths = {}
+        signature = self.__data[0:4]
+        if (signature == "wOFF"):
+            num_tables = struct.unpack_from(">H", self.__data, 12)[0]
+            for i in range(num_tables):
+                tag, offset, comp_length, orig_length, checksum = struct.unpack_from(">4sLLLL", self.__data, 44 + 20 * i)
+                lengths[tag] = orig_length
+            return lengths
+        if (signature == "wOF2"):
+            for tag, orig_length, offset, length in self.__get_woff2_directory()[0]:
+                lengths[tag] = orig_length
+            return lengths
+        for tag, offset, length in self.__get_sfnt_directory():
+            lengths[tag] = length
+        return lengths
+
+    # helper: get the contents of the cmap table
+    def __get_cmap_table(self):
+        return self.__get_table("cmap")
+
+    # helper: get the contents of the table with the given tag
+    def __get_table(self, wanted_tag):
+        signature = self.__data[0:4]
+        if (signature == "wOFF"):
+            return self.__get_woff_table(wanted_tag)
+        if (signature == "wOF2"):
+            return self.__get_woff2_table(wanted_tag)
+        for tag, offset, length in self.__get_sfnt_directory():
+            if (tag == wanted_tag):
+                return self.__data[offset:offset + length]
+        raise Exception("No %s table found" % (wanted_tag))
+
+    # helper: get the table directory of a TTF/OTF font, as [ tag, offset, length ]
+    def __get_sfnt_directory(self):
+        offset = 0
+        signature = self.__data[0:4]
+        if (signature == "ttcf"):
+            # TrueType collection: use the first font
+            offset = struct.unpack_from(">L", self.__data, 12)[0]
+        if (not (self.__data[offset:offset + 4] in ["\x00\x01\x00\x00", "OTTO", "true", "typ1"])):
+            raise Exception("Unknown font file format")
+        num_tables = struct.unpack_from(">H", self.__data, offset + 4)[0]
+        directory = []
+        for i in range(num_tables):
+            tag, checksum, table_offset, length = struct.unpack_from(">4sLLL", self.__data, offset + 12 + 16 * i)
+            directory.append([tag, table_offset, length])
+        return directory
+
+    def __get_woff_table(self, wanted_tag):
+        num_tables = struct.unpack_from(">H", self.__data, 12)[0]
+        for i in range(num_tables):
+            tag, offset, comp_length, orig_length, checksum = struct.unpack_from(">4sLLLL", self.__data, 44 + 20 * i)
+            if (tag == wanted_tag):
+                table = self.__data[offset:offset + comp_length]
+                if (comp_length < orig_length):
+                    import zlib
+                    table = zlib.decompress(table)
+                return table
+        raise Exception("No %s table found" % (wanted_tag))
+
+    # helper: get the table directory of a WOFF2 font,
+    # as [ [ tag, original length, offset, length ], ... ]
+    # (offset and length in the decompressed stream of tables),
+    # and the position of the compressed stream
+    def __get_woff2_directory(self):
+        def read_base128(position):
+            value = 0
+            for i in range(5):
+                byte = ord(self.__data[position])
+                position += 1
+                value = (value << 7) | (byte & 0x7f)
+                if ((byte & 0x80) == 0):
+                    return value, position
+            raise Exception("Invalid UIntBase128 value in WOFF2 table directory")
+
+        num_tables = struct.unpack_from(">H", self.__data, 12)[0]
+        position = 48
+        table_offset = 0
+        directory = []
+        for i in range(num_tables):
+            flags = ord(self.__data[position])
+            position += 1
+            if ((flags & 0x3f) == 0x3f):
+                tag = self.__data[position:position + 4]
+                position += 4
+            else:
+                tag = self.WOFF2_KNOWN_TAGS[flags & 0x3f]
+            transform_version = (flags >> 6) & 0x03
+            orig_length, position = read_base128(position)
+            table_length = orig_length
+            # glyf and loca are transformed unless version is 3,
+            # the other tables are transformed unless version is 0
+            if (((tag in ["glyf", "loca"]) and (transform_version != 3)) or
+                ((not (tag in ["glyf", "loca"])) and (transform_version != 0))):
+                table_length, position = read_base128(position)
+            directory.append([tag, orig_length, table_offset, table_length])
+            table_offset += table_length
+        return [directory, position]
+
+    def __get_woff2_table(self, wanted_tag):
+        brotli = import_optional("brotli")
+        if (brotli == None):
+            raise Exception("Reading WOFF2 fonts requires the Python module 'brotli'")
+        directory, position = self.__get_woff2_directory()
+        wanted = None
+        for tag, orig_length, table_offset, table_length in directory:
+            if ((tag == wanted_tag) and (wanted == None)):
+                wanted = [table_offset, table_length]
+        if (wanted == None):
+            raise Exception("No %s table found" % (wanted_tag))
+        if (self.__data[4:8] == "ttcf"):
+            raise Exception("WOFF2 font collections are not supported")
+        compressed_length = struct.unpack_from(">L", self.__data, 20)[0]
+        tables = brotli.decompress(self.__data[position:position + compressed_length])
+        return tables[wanted[0]:wanted[0] + wanted[1]]
+
+    # helper: get the [start, stop] runs of codepoints mapped
+    # by the subtable at the given offset, None if the format is not supported
+    def __get_subtable_ranges(self, cmap, offset):
+        def get_runs(codepoints):
+            runs = []
+            for c in codepoints:
+                if ((len(runs) > 0) and (runs[-1][1] == c - 1)):
+                    runs[-1][1] = c
+                else:
+                    runs.append([c, c])
+            return runs
+
+        fmt = struct.unpack_from(">H", cmap, offset)[0]
+        if (fmt == 0):
+            glyphs = struct.unpack_from(">256B", cmap, offset + 6)
+            return get_runs([c for c in range(256) if (glyphs[c] != 0)])
+        if (fmt == 4):
+            seg_count = struct.unpack_from(">H", cmap, offset + 6)[0] // 2
+            end_codes = struct.unpack_from(">%dH" % (seg_count), cmap, offset + 14)
+            start_codes = struct.unpack_from(">%dH" % (seg_count), cmap, offset + 16 + 2 * seg_count)
+            deltas = struct.unpack_from(">%dH" % (seg_count), cmap, offset + 16 + 4 * seg_count)
+            range_offsets_position = offset + 16 + 6 * seg_count
+            range_offsets = struct.unpack_from(">%dH" % (seg_count), cmap, range_offsets_position)
+            ranges = []
+            for i in range(seg_count):
+                start = start_codes[i]
+                stop = end_codes[i]
+                if ((start == 0xffff) or (start > stop)):
+                    continue
+                if (range_offsets[i] == 0):
+                    # glyph = codepoint + delta, only one codepoint might map to glyph 0
+                    notdef = (0x10000 - deltas[i]) & 0xffff
+                    if (start <= notdef <= stop):
+                        if (start < notdef):
+                            ranges.append([start, notdef - 1])
+                        if (notdef < stop):
+                            ranges.append([notdef + 1, stop])
+                    else:
+                        ranges.append([start, stop])
+                else:
+                    position = range_offsets_position + 2 * i + range_offsets[i]
+                    glyphs = struct.unpack_from(">%dH" % (stop - start + 1), cmap, position)
+                    codepoints = []
+                    for c in range(start, stop + 1):
+                        glyph = glyphs[c - start]
+                        if ((glyph != 0) and (((glyph + deltas[i]) & 0xffff) != 0)):
+                            codepoints.append(c)
+                    ranges += get_runs(codepoints)
+            return ranges
+        if (fmt == 6):
+            first_code, entry_count = struct.unpack_from(">HH", cmap, offset + 6)
+            glyphs = struct.unpack_from(">%dH" % (entry_count), cmap, offset + 10)
+            return get_runs([first_code + i for i in range(entry_count) if (glyphs[i] != 0)])
+        if (fmt in [12, 13]):
+            num_groups = struct.unpack_from(">L", cmap, offset + 12)[0]
+            groups = struct.unpack_from(">%dL" % (3 * num_groups), cmap, offset + 16)
+            ranges = []
+            for i in range(0, 3 * num_groups, 3):
+                start, stop, glyph = groups[i:i + 3]
+                if (glyph == 0):
+                    # format 12: only start maps to glyph 0, format 13: all of them
+                    if (fmt == 13):
+                        continue
+                    start += 1
+                if (start <= stop):
+                    ranges.append([start, min(stop, 0x10ffff)])
+            return ranges
+        return None
+
+
+
+class SubsetSizeEstimator:
+
+    # estimate the size (in bytes) of a subset of a TTF/OTF/WOFF/WOFF2 font
+    # with a given number of glyphs: the tables holding per-glyph data
+    # (GLYPH_TABLES: outlines, metrics, glyph names, character map, kerning,
+    # and layout) shrink in proportion to the number of glyphs kept
+    # (plus .notdef), while the other tables (e.g., name, hinting programs)
+    # are assumed to be kept whole; as kerning and layout shrink faster,
+    # the estimate is high for small subsets, unless calibrated
+    # against the size of a real subset (see calibrate())
+
+    GLYPH_TABLES = [
+        "glyf", "loca", "CFF ", "CFF2", "hmtx", "vmtx", "hdmx", "LTSH", "VORG",
+        "post", "cmap", "kern", "GDEF", "GPOS", "GSUB", "MATH"
+    ]
+
+    # the header of the post table is kept whole
+    POST_HEADER_SIZE = 32
+
+    __overhead = 0
+    __glyph_data = 0
+    __num_glyphs = 1
+
+    def __init__(self, font_file):
+        reader = CmapReader(font_file)
+        self.__num_glyphs = max(1, reader.get_num_glyphs())
+        for tag, length in reader.get_table_lengths().items():
+            if (tag == "post"):
+                header = min(length, self.POST_HEADER_SIZE)
+                self.__overhead += header
+                self.__glyph_data += length - header
+            elif (tag in self.GLYPH_TABLES):
+                self.__glyph_data += length
+            else:
+                self.__overhead += length
+
+    def estimate(self, glyph_count):
+        glyph_count = min(glyph_count + 1, self.__num_glyphs)
+        return self.__overhead + (self.__glyph_data * glyph_count) // self.__num_glyphs
+
+    # correct the fixed overhead, so that the estimate for glyph_count glyphs
+    # is the size (in bytes) of a real subset with glyph_count glyphs
+    def calibrate(self, glyph_count, size):
+        self.__overhead = max(0, self.__overhead + size - self.estimate(glyph_count))
+
+class FontCache:
+
+    # on-disk cache of the codepoint sets of font files:
+    # each font is stored in its own entry file, named after
+    # the SHA-1 of the font contents, while the index file maps
+    # the path of each font to its size, mtime and SHA-1,
+    # so that an unmodified font is found without reading it;
+    # entries are evicted in least recently used order
+    # (the mtime of an entry file is updated at each use)
+    # when the total size of the entries exceeds MAX_SIZE;
+    # the cache is best effort: a missing, unwritable, or malformed cache
+    # is ignored, and the codepoint set read by the loader is used
+
+    INDEX_FILE = "index.json"
+    ENTRY_SUFFIX = ".cmap.json"
+    MAX_SIZE = 64 * 1024 * 1024
+
+    __directory = None
+    __max_size = MAX_SIZE
+
+    def __init__(self, directory=None, max_size=MAX_SIZE):
+        if (directory == None):
+            directory = get_cache_directory()
+        self.__directory = directory
+        self.__max_size = max_size
+
+    def get_directory(self):
+        return self.__directory
+
+    # return the codepoint set of font_file, calling
+    # loader(font_file) and storing its result on a cache miss
+    def get_codepoint_set(self, font_file, loader):
+        path = os.path.abspath(font_file)
+        stat = os.stat(path)
+        index = self.__read_index()
+        sha1 = None
+        if ((path in index) and
+            (index[path]["size"] == stat.st_size) and
+            (index[path]["mtime"] == stat.st_mtime)):
+            sha1 = index[path]["sha1"]
+        else:
+            sha1 = self.__hash_file(path)
+        codepoint_set = None
+        entry = self.__read_entry(sha1)
+        if (entry != None):
+            try:
+                codepoint_set = CodepointSet.from_ranges(entry["ranges"])
+            except (TypeError, KeyError, ValueError, IndexError):
+                # malformed entry, read the font again
+                codepoint_set = None
+        if (codepoint_set == None):
+            codepoint_set = loader(font_file)
+            entry = {
+                "font": path,
+                "sha1": sha1,
+                "size": stat.st_size,
+                "ranges": codepoint_set.get_ranges()
+            }
+            self.__write_json(self.__get_entry_file(sha1), entry)
+        if ((not (path in index)) or (index[path]["sha1"] != sha1) or (index[path]["mtime"] != stat.st_mtime)):
+            index[path] = { "size": stat.st_size, "mtime": stat.st_mtime, "sha1": sha1 }
+            self.__write_json(self.__get_index_file(), index)
+        try:
+            self.__evict(keep=sha1)
+        except (IOError, OSError, ValueError, TypeError, KeyError):
+            # entries are evicted again at the next use
+            pass
+        return codepoint_set
+
+    # return a list of [ sha1, entry file size, last use, number of codepoints, font path ],
+    # the most recently used first
+    def get_entries(self):
+        entries = []
+        for name in self.__get_entry_names():
+            entry_file = os.path.join(self.__directory, name)
+            entry = self.__read_json(entry_file)
+            try:
+                stat = os.stat(entry_file)
+                count = 0
+                for r in entry["ranges"]:
+                    count += r[1] - r[0] + 1
+                entries.append([entry["sha1"], stat.st_size, stat.st_mtime, count, entry["font"]])
+            except (OSError, TypeError, KeyError, ValueError, IndexError):
+                # skip missing or malformed entries
+                continue
+        entries.sort(key=lambda x: -x[2])
+        return entries
+
+    # delete all the entries and the index
+    def purge(self):
+        count = 0
+        for name in self.__get_entry_names() + [self.INDEX_FILE]:
+            path = os.path.join(self.__directory, name)
+            if (os.path.exists(path)):
+                os.remove(path)
+                if (name != self.INDEX_FILE):
+                    count += 1
+        return count
+
+    def __evict(self, keep=None):
+        entries = []
+        total = 0
+        for name in self.__get_entry_names():
+            stat = os.stat(os.path.join(self.__directory, name))
+            entries.append([stat.st_mtime, stat.st_size, name])
+            total += stat.st_size
+        if (total <= self.__max_size):
+            return
+        evicted = []
+        for mtime, size, name in sorted(entries):
+            if (total <= self.__max_size):
+                break
+            sha1 = name[:-len(self.ENTRY_SUFFIX)]
+            if (sha1 != keep):
+                os.remove(os.path.join(self.__directory, name))
+                evicted.append(sha1)
+                total -= size
+        index = self.__read_index()
+        for path in index.keys():
+            if (index[path]["sha1"] in evicted):
+                del index[path]
+        self.__write_json(self.__get_index_file(), index)
+
+    def __get_entry_names(self):
+        if (not os.path.isdir(self.__directory)):
+            return []
+        return sorted([n for n in os.listdir(self.__directory) if n.endswith(self.ENTRY_SUFFIX)])
+
+    def __get_entry_file(self, sha1):
+        return os.path.join(self.__directory, sha1 + self.ENTRY_SUFFIX)
+
+    def __get_index_file(self):
+        return os.path.join(self.__directory, self.INDEX_FILE)
+
+    def __hash_file(self, path):
+        import hashlib
+        h = hashlib.sha1()
+        f = open(path, "rb")
+        while True:
+            data = f.read(TextCounter.CHUNK_SIZE)
+            if (len(data) == 0):
+                break
+            h.update(data)
+        f.close()
+        return h.hexdigest()
+
+    # return the index, without its malformed items
+    def __read_index(self):
+        index = self.__read_json(self.__get_index_file())
+        if (not isinstance(index, dict)):
+            return {}
+        valid = {}
+        for path, item in index.items():
+            if ((isinstance(item, dict)) and ("size" in item) and ("mtime" in item) and ("sha1" in item)):
+                valid[path] = item
+        return valid
+
+    def __read_entry(self, sha1):
+        entry_file = self.__get_entry_file(sha1)
+        entry = self.__read_json(entry_file)
+        if (not isinstance(entry, dict)):
+            return None
+        try:
+            # mark as recently used
+            os.utime(entry_file, None)
+        except OSError:
+            pass
+        return entry
+
+    def __read_json(self, path):
+        import json
+        try:
+            f = open(path, "rb")
+            obj = json.load(f)
+            f.close()
+            return obj
+        except (IOError, OSError, ValueError):
+            return None
+
+    # helper: write atomically, so that concurrent runs never read a partial file
+    def __write_json(self, path, obj):
+        import json
+        try:
+            if (not os.path.isdir(self.__directory)):
+                os.makedirs(self.__directory)
+            tmp_path = "%s.%s.tmp" % (path, os.getpid())
+            f = open(tmp_path, "wb")
+            json.dump(obj, f)
+            f.close()
+            os.rename(tmp_path, path)
+        except (IOError, OSError, ValueError, TypeError):
+            # the codepoint set works in memory anyway
+            pass
+
+
+
+class UnicodeNameIndex:
+
+    # inverted index mapping each word of the Unicode character names
+    # to the sorted list of the codepoints whose name contains it,
+    # built once for each version of the Unicode database
+    # (unicodedata.unidata_version) and stored in the cache directory
+
+    __words = None
+
+    def __init__(self, directory=None):
+        if (directory == None):
+            directory = get_cache_directory()
+        import marshal
+        index_file = os.path.join(directory, "names-%s.marshal" % (unicodedata.unidata_version))
+        try:
+            f = open(index_file, "rb")
+            self.__words = marshal.load(f)
+            f.close()
+        except (IOError, EOFError, ValueError, TypeError):
+            self.__words = self.__build()
+            self.__write(directory, index_file)
+
+    # return the sorted list of the codepoints whose name contains all the given words
+    def lookup(self, words):
+        postings = []
+        for w in set(words):
+            if (not (w in self.__words)):
+                return []
+            postings.append(self.__words[w])
+        if (len(postings) == 0):
+            return []
+        # intersect, starting from the shortest posting list
+        postings.sort(key=len)
+        results = []
+        for c in postings[0]:
+            is_match = True
+            for p in postings[1:]:
+                i = bisect.bisect_left(p, c)
+                if ((i == len(p)) or (p[i] != c)):
+                    is_match = False
+                    break
+            if (is_match):
+                results.append(c)
+        return results
+
+    def __build(self):
+        words = collections.defaultdict(list)
+        # Unicode codepoints range from 0 to 0x10FFFF = 1114111
+        for i in xrange(1114112):
+            name = unicodedata.name(unichr(i), None)
+            if (name != None):
+                for w in set(name.split(" ")):
+                    words[w].append(i)
+        return dict(words)
+
+    def __write(self, directory, index_file):
+        import marshal
+        try:
+            if (not os.path.isdir(directory)):
+                os.makedirs(directory)
+            tmp_file = "%s.%s.tmp" % (index_file, os.getpid())
+            f = open(tmp_file, "wb")
+            marshal.dump(self.__words, f)
+            f.close()
+            os.rename(tmp_file, index_file)
+        except (IOError, OSError):
+            # the index works in memory anyway
+            pass
+
+
+
+# helpers for reading ebooks, defined at module level
+# so that they can be run by a multiprocessing pool:
+# each returns a histogram (character -> number of occurrences)
+# and histograms are merged by the caller
+
+# helper: decode the XML entity &name; (name = "amp", "#233", "#xe9", ...),
+# returning the empty string for unknown entities
+def decode_xml_entity(name):
+    import htmlentitydefs
+    if (name in htmlentitydefs.name2codepoint):
+        # named entity
+        return unichr(htmlentitydefs.name2codepoint[name])
+    if ((len(name) > 1) and (name[0] == "#")):
+        # numeric
+        try:
+            if ((len(name) > 2) and (name[1] in "xX")):
+                return unichr(int(name[2:], 16))
+            return unichr(int(name[1:]))
+        except ValueError:
+            return u""
+    # error!
+    return u""
+
+# helper: add the number of occurrences of each character of text
+# to histogram, vectorized with NumPy if available
+# (only on wide builds: on narrow builds, unichr() cannot map
+# the UTF-32 code units of astral characters back to characters)
+def update_histogram(histogram, text):
+    numpy = None
+    if (sys.maxunicode > 0xFFFF):
+        numpy = import_optional("numpy")
+    if ((numpy == None) or (len(text) == 0)):
+        histogram.update(text)
+        return
+    # UTF-32 code units are the codepoints of the characters
+    codepoints = numpy.frombuffer(text.encode("utf-32-le"), dtype=numpy.uint32)
+    values, counts = numpy.unique(codepoints, return_counts=True)
+    for value, count in itertools.izip(values.tolist(), counts.tolist()):
+        histogram[unichr(value)] += count
+
+class TextCounter:
+
+    # count the occurrences of each character of a text,
+    # decoding XML entities but otherwise keeping the text as it is
+    # (used to count characters while preserving X(HT)ML tags),
+    # reading the text incrementally (see feed()) so that
+    # memory does not depend on the length of the text:
+    # an entity split between two chunks is kept
+    # until the next chunk (or close()) completes it
+
+    CHUNK_SIZE = 65536
+
+    histogram = None
+    __entity_tail = u""
+
+    def __init__(self):
+        self.histogram = collections.Counter()
+        self.__entity_tail = u""
+
+    # process the next chunk of text
+    def feed(self, text):
+        text = self.__entity_tail + text
+        # an "&" not followed by ";" might start an entity ending in the next chunk
+        m = re.search(r"&[#a-zA-Z0-9]*$", text)
+        if (m != None):
+            text, self.__entity_tail = text[:m.start()], text[m.start():]
+        else:
+            self.__entity_tail = u""
+        update_histogram(self.histogram, re.sub(r"&([#a-zA-Z0-9]+);", lambda m: (decode_xml_entity(m.group(1)) or m.group(0)), text))
+
+    # process the text still kept
+    def close(self):
+        update_histogram(self.histogram, self.__entity_tail)
+        self.__entity_tail = u""
+
+class XHTMLTextCounter(HTMLParser.HTMLParser):
+
+    # count the occurrences of each character in the text content
+    # of an X(HT)ML document, in a single incremental pass
+    # (see feed() and close() of HTMLParser):
+    # tags, comments, processing instructions, declarations,
+    # and the contents of <script> and <style> are skipped,
+    # CDATA sections are counted verbatim;
+    # in each text node, newlines count as spaces,
+    # runs of spaces are collapsed into a single space,
+    # and entities are decoded (unknown or malformed ones are kept as text);
+    # the text is buffered and counted in blocks of (about) CHUNK_SIZE
+    # characters, see update_histogram()
+
+    CHUNK_SIZE = TextCounter.CHUNK_SIZE
+    SKIPPED_ELEMENTS = [ "script", "style" ]
+
+    # the parser stops only at "<", so that each text node, entities included,
+    # reaches handle_data() as it is (split only at the end of a chunk)
+    INTERESTING = re.compile(r"<")
+
+    histogram = None
+    __skip_depth = 0
+    __last_is_space = False
+    __entity_tail = u""
+    __pending = None
+    __pending_length = 0
+
+    def __init__(self):
+        HTMLParser.HTMLParser.__init__(self)
+        self.histogram = collections.Counter()
+        self.__skip_depth = 0
+        self.__last_is_space = False
+        self.__entity_tail = u""
+        self.__pending = []
+        self.__pending_length = 0
+
+    def reset(self):
+        HTMLParser.HTMLParser.reset(self)
+        self.interesting = self.INTERESTING
+
+    def clear_cdata_mode(self):
+        HTMLParser.HTMLParser.clear_cdata_mode(self)
+        self.interesting = self.INTERESTING
+
+    def close(self):
+        HTMLParser.HTMLParser.close(self)
+        self.__end_text()
+        self.__flush()
+
+    def handle_starttag(self, tag, attrs):
+        self.__end_text()
+        if (tag in self.SKIPPED_ELEMENTS):
+            self.__skip_depth += 1
+
+    def handle_startendtag(self, tag, attrs):
+        # empty element, e.g. <script src="..."/>
+        self.__end_text()
+
+    def handle_endtag(self, tag):
+        self.__end_text()
+        if ((tag in self.SKIPPED_ELEMENTS) and (self.__skip_depth > 0)):
+            self.__skip_depth -= 1
+
+    def handle_comment(self, data):
+        self.__end_text()
+
+    def handle_decl(self, decl):
+        self.__end_text()
+
+    def handle_pi(self, data):
+        self.__end_text()
+
+    def unknown_decl(self, data):
+        self.__end_text()
+        if ((data.startswith("CDATA[")) and (self.__skip_depth == 0)):
+            self.__count(data[6:])
+
+    def handle_data(self, data):
+        if (self.__skip_depth > 0):
+            return
+        data = data.replace("\n", " ")
+        data = data.replace("\r", " ")
+        if (self.__last_is_space):
+            data = data.lstrip(" ")
+        if (len(data) == 0):
+            return
+        self.__last_is_space = (data[-1] == " ")
+        text = self.__entity_tail + re.sub(r"[ ]+", " ", data)
+        # an "&" not followed by ";" might start an entity ending in the next chunk
+        m = re.search(r"&[#a-zA-Z0-9]*$", text)
+        if (m != None):
+            text, self.__entity_tail = text[:m.start()], text[m.start():]
+        else:
+            self.__entity_tail = u""
+        self.__count(re.sub(r"&([#a-zA-Z0-9]+);", lambda m: (decode_xml_entity(m.group(1)) or m.group(0)), text))
+
+    # the current text node ends: an entity still incomplete is just text
+    def __end_text(self):
+        if (len(self.__entity_tail) > 0):
+            self.__count(self.__entity_tail)
+            self.__entity_tail = u""
+        self.__last_is_space = False
+
+    def __count(self, s):
+        if (len(s) > 0):
+            self.__pending.append(s)
+            self.__pending_length += len(s)
+            if (self.__pending_length >= self.CHUNK_SIZE):
+                self.__flush()
+
+    def __flush(self):
+        update_histogram(self.histogram, u"".join(self.__pending))
+        self.__pending = []
+        self.__pending_length = 0
+
+# helper: clean the text read from the given file object,
+# which returns (decoded) chunks of text, and count its characters
+def get_file_histogram(f, preserve=False):
+    if (preserve):
+        counter = TextCounter()
+    else:
+        counter = XHTMLTextCounter()
+    while True:
+        text = f.read(TextCounter.CHUNK_SIZE)
+        if (len(text) == 0):
+            break
+        counter.feed(text)
+    counter.close()
+    return counter.histogram
+
+# helper: check whether the member with the given name
+# is one of the X(HT)ML pages of an ebook without an OPF
+# (e.g., a plain ZIP archive of pages), judging by its extension
+def is_text_member(name):
+    return ((name.lower().endswith(".xhtml")) or
+            (name.lower().endswith(".html")) or
+            (name.lower().endswith(".htm")) or
+            ((name.lower().endswith(".xml")) and (not name.startswith("META-INF"))))
+
+# helper: get the names of the X(HT)ML members of an ebook without an OPF
+def get_ebook_member_names(zfile):
+    names = []
+    for name in zfile.namelist():
+        if (is_text_member(name)):
+            names.append(name)
+    return names
+
+# helper: get the encoding declared at the beginning (head) of an X(HT)ML document,
+# by its byte order mark, its XML declaration, or its <meta> charset,
+# or UTF-8 if none is declared
+def get_declared_encoding(head):
+    if (head.startswith(codecs.BOM_UTF8)):
+        return "utf-8-sig"
+    if ((head.startswith(codecs.BOM_UTF16_LE)) or (head.startswith(codecs.BOM_UTF16_BE))):
+        return "utf-16"
+    match = re.match(r"^\s*<\?xml[^>]*\sencoding\s*=\s*[\"']([A-Za-z0-9._:-]+)[\"']", head)
+    if (match == None):
+        match = re.search(r"<meta[^>]*\scharset\s*=\s*[\"']?([A-Za-z0-9._:-]+)", head, re.IGNORECASE)
+    if (match == None):
+        return "utf-8"
+    try:
+        return codecs.lookup(match.group(1)).name
+    except LookupError:
+        raise Exception("Unknown encoding '%s'" % (match.group(1)))
+
+class EbookSource:
+
+    # the members of an ebook, either packed in an EPUB/ZIP file
+    # or unpacked in a directory (e.g., the source tree of an EPUB),
+    # where member names are the paths relative to the directory
+
+    __ebook_file = None
+    __zfile = None
+    __zfile_names = None
+
+    def __init__(self, ebook_file):
+        self.__ebook_file = ebook_file
+        if (not os.path.isdir(ebook_file)):
+            import zipfile
+            self.__zfile = zipfile.ZipFile(ebook_file)
+
+    # return the names of the members with text to count:
+    # the content documents listed in the OPF of an EPUB
+    # (with navigation, also its NCX, nav document, and OPF, see get_ebook_text_member_names)
+    # or, without an OPF, the X(HT)ML members
+    def get_names(self, navigation=False):
+        if (self.exists(EPUB_CONTAINER)):
+            return get_ebook_text_member_names(self, navigation)
+        if (self.__zfile != None):
+            return get_ebook_member_names(self.__zfile)
+        names = []
+        for root, dirs, files in os.walk(self.__ebook_file):
+            dirs.sort()
+            for name in sorted(files):
+                name = os.path.relpath(os.path.join(root, name), self.__ebook_file).replace(os.sep, "/")
+                if (is_text_member(name)):
+                    names.append(name)
+        return names
+
+    # check whether the given member exists
+    def exists(self, name):
+        if (self.__zfile != None):
+            if (self.__zfile_names == None):
+                self.__zfile_names = set(self.__zfile.namelist())
+            return (name in self.__zfile_names)
+        return os.path.isfile(self.__get_path(name))
+
+    # return the contents of the given member
+    def read(self, name):
+        if (self.__zfile != None):
+            return self.__zfile.read(name)
+        f = open(self.__get_path(name), "rb")
+        data = f.read()
+        f.close()
+        return data
+
+    # return the uncompressed size of the given member
+    def get_size(self, name):
+        if (self.__zfile != None):
+            return self.__zfile.getinfo(name).file_size
+        return os.path.getsize(self.__get_path(name))
+
+    # return a string which changes whenever the contents of the given member change:
+    # the CRC32 and size stored in the ZIP directory (so that nothing is decompressed)
+    # or the SHA-1 of the file
+    def get_signature(self, name):
+        if (self.__zfile != None):
+            info = self.__zfile.getinfo(name)
+            return "crc32:%08x:%d" % (info.CRC & 0xffffffff, info.file_size)
+        import hashlib
+        digest = hashlib.sha1()
+        f = open(self.__get_path(name), "rb")
+        while True:
+            data = f.read(1 << 20)
+            if (len(data) == 0):
+                break
+            digest.update(data)
+        f.close()
+        return "sha1:%s" % (digest.hexdigest())
+
+    # return a (binary) file object for the given member
+    def open(self, name):
+        if (self.__zfile != None):
+            return self.__zfile.open(name)
+        return open(self.__get_path(name), "rb")
+
+    def close(self):
+        if (self.__zfile != None):
+            self.__zfile.close()
+
+    def __get_path(self, name):
+        return os.path.join(self.__ebook_file, *name.split("/"))
+
+# helper: count the characters in each of the given members of an ebook,
+# returning a dictionary member name -> histogram
+# job = [ ebook_file, member_names, preserve ]
+def get_ebook_member_histograms(job):
+    ebook_file, names, preserve = job
+    histograms = {}
+    source = EbookSource(ebook_file)
+    for name in names:
+        histograms[name] = collections.Counter()
+        member = source.open(name)
+        try:
+            encoding = get_declared_encoding(member.read(1024))
+        except Exception as e:
+            raise Exception("Unable to decode member '%s': %s" % (name, e))
+        finally:
+            member.close()
+        # stream the member through an incremental decoder
+        member = source.open(name)
+        try:
+            histograms[name] = get_file_histogram(codecs.getreader(encoding)(member), preserve)
+        except UnicodeDecodeError as e:
+            # a member not in its declared encoding would be miscounted
+            raise Exception("Unable to decode member '%s' as %s: %s" % (name, encoding, e))
+        except HTMLParser.HTMLParseError as e:
+            # a member which cannot be parsed would be miscounted
+            raise Exception("Unable to parse member '%s': %s" % (name, e))
+        finally:
+            member.close()
+    source.close()
+    return histograms
+
+# helper: count the characters in the given members of an ebook
+# job = [ ebook_file, member_names, preserve ]
+def get_ebook_members_histogram(job):
+    histogram = collections.Counter()
+    for h in get_ebook_member_histograms(job).values():
+        histogram.update(h)
+    return histogram
+
+# helper: count the characters in all the members of an ebook,
+# returning [ histogram, None ] or [ None, error message ]
+# job = [ ebook_file, preserve, navigation ]
+def get_ebook_histogram(job):
+    ebook_file, preserve, navigation = job
+    try:
+        source = EbookSource(ebook_file)
+        names = source.get_names(navigation)
+        source.close()
+        return [get_ebook_members_histogram([ebook_file, names, preserve]), None]
+    except Exception as e:
+        return [None, str(e)]
+
+# helper: select the glyphs of font (a fontforge font) with the given codepoints,
+# in a single call, and remove them (exclude = True) or all the others
+def subset_fontforge_font(font, codepoint_set, exclude=False):
+    font.selection.none()
+    codepoints = list(codepoint_set)
+    if (len(codepoints) > 0):
+        font.selection.select(("unicode",), *codepoints)
+    if (not exclude):
+        font.selection.invert()
+    font.clear()
+
+# fonts opened with fontforge by the parent process, as [ font, codepoint set ],
+# inherited by the worker processes of a batch subset:
+# as each worker process subsets one font and then exits,
+# every subset starts from a fresh (copy-on-write) clone of the loaded font
+SUBSET_FONTS = []
+
+# helper: subset one of SUBSET_FONTS with the given codepoints
+# (or without them, if exclude is True),
+# returning [ size of the generated font, None ] or [ None, error message ]
+# job = [ font position, codepoint set, exclude, output_file ]
+def subset_font_with_codepoints(job):
+    position, codepoint_set, exclude, output_file = job
+    try:
+        font, font_codepoint_set = SUBSET_FONTS[position]
+        subset_fontforge_font(font, codepoint_set.intersection(font_codepoint_set), exclude)
+        font.generate(output_file)
+        return [os.path.getsize(output_file), None]
+    except Exception as e:
+        return [None, str(e)]
+
+# helper: generate the subset of font_file (with fontforge) with the given codepoints,
+# returning [ file extension, font data ]
+def generate_subset_font(font_file, codepoint_set):
+    import tempfile
+    fontforge = import_optional("fontforge")
+    if (fontforge == None):
+        raise Exception("This command requires the Python module 'fontforge'")
+    extension = os.path.splitext(font_file)[1].lower()
+    if (not (extension in [".otf", ".ttf", ".woff", ".woff2"])):
+        extension = ".ttf"
+    font = fontforge.open(font_file)
+    try:
+        subset_fontforge_font(font, codepoint_set)
+        # fontforge can generate a font only into a file
+        handle, temp_file = tempfile.mkstemp(suffix=extension)
+        os.close(handle)
+        try:
+            font.generate(temp_file)
+            f = open(temp_file, "rb")
+            data = f.read()
+            f.close()
+        finally:
+            os.remove(temp_file)
+    finally:
+        font.close()
+    return [extension, data]
+
+class EbookManifest:
+
+    # a JSON file recording the signature and the character histogram
+    # of each member of an ebook, so that the next run re-reads only
+    # the members whose signature changed (see EbookSource.get_signature);
+    # the members not seen in the current run are dropped on save
+
+    VERSION = 2
+
+    __manifest_file = None
+    __preserve = False
+    __old_members = None
+    __members = None
+
+    def __init__(self, manifest_file, preserve=False):
+        self.__manifest_file = manifest_file
+        self.__preserve = preserve
+        self.__old_members = {}
+        self.__members = {}
+        try:
+            import json
+            f = open(manifest_file, "rb")
+            obj = json.load(f)
+            f.close()
+            # histograms counted with a different --preserve cannot be reused
+            if ((obj.get("version") == self.VERSION) and (obj.get("preserve") == preserve)):
+                self.__old_members = obj["members"]
+        except (IOError, ValueError, KeyError):
+            pass
+
+    # return the histogram of the given member, if its signature did not change,
+    # or None
+    def get_histogram(self, name, signature):
+        entry = self.__old_members.get(name)
+        if ((entry == None) or (entry["signature"] != signature)):
+            return None
+        self.__members[name] = entry
+        return collections.Counter(entry["histogram"])
+
+    def set_histogram(self, name, signature, histogram):
+        self.__members[name] = {"signature": signature, "histogram": dict(histogram)}
+
+    # write the manifest atomically
+    def save(self):
+        import json
+        tmp_file = "%s.%s.tmp" % (self.__manifest_file, os.getpid())
+        f = open(tmp_file, "wb")
+        json.dump({"version": self.VERSION, "preserve": self.__preserve, "members": self.__members}, f, sort_keys=True)
+        f.close()
+        os.rename(tmp_file, self.__manifest_file)
+
+# helpers for (de)obfuscating fonts embedded in ebooks:
+# the header of the font is XORed with a key derived from the book id,
+# so applying the same mask twice gives back the original font
+
+# helper: get the size of the obfuscated header, as [ rows, row length ]
+def get_obfuscation_header_size(idpf_algorithm=True):
+    if (idpf_algorithm):
+        return [52, 20]
+    else:
+        return [64, 16]
+
+# helper: get the obfuscation key from the given book id
+def get_obfuscation_key(key, idpf_algorithm=True):
+    k = key
+    if (idpf_algorithm):
+        k = k.replace(u"\u0020", "")
+        k = k.replace(u"\u0009", "")
+        k = k.replace(u"\u000d", "")
+        k = k.replace(u"\u000a", "")
+        if (isinstance(k, unicode)):
+            k = k.encode("utf-8")
+        import hashlib
+        d = hashlib.sha1(k).digest()
+    else:
+        # the Adobe algorithm uses the 16 bytes of the UUID, e.g. "urn:uuid:..."
+        import uuid
+        try:
+            d = uuid.UUID(k.strip()).bytes
+        except ValueError:
+            raise Exception("The Adobe algorithm requires a UUID as id, not '%s'" % (key))
+    return str(d)
+
+# helper: get the byte string to be XORed with the whole header,
+# that is, the key repeated (and truncated) to fill each row
+def get_obfuscation_mask(key, idpf_algorithm=True):
+    rows, row_length = get_obfuscation_header_size(idpf_algorithm)
+    key = get_obfuscation_key(key, idpf_algorithm)
+    row = (key * (row_length // len(key) + 1))[:row_length]
+    return row * rows
+
+# helper: copy the font read from source to destination (file objects),
+# XORing its header with mask in one operation on (long) integers
+# and streaming the rest, so that the font is never loaded in memory
+def obfuscate_font_stream(source, destination, mask):
+    import binascii, shutil
+    header = source.read(len(mask))
+    if (len(header) > 0):
+        value = int(binascii.hexlify(header), 16) ^ int(binascii.hexlify(mask[:len(header)]), 16)
+        destination.write(binascii.unhexlify("%0*x" % (2 * len(header), value)))
+    shutil.copyfileobj(source, destination)
+
+# obfuscation algorithms, as identified in META-INF/encryption.xml,
+# mapped to the idpf_algorithm flag of the helpers above
+OBFUSCATION_ALGORITHMS = {
+    "http://www.idpf.org/2008/embedding": True,
+    "http://ns.adobe.com/pdf/enc#RC": False
+}
+
+# helpers for reading and rewriting the structure of an EPUB file
+EPUB_CONTAINER = "META-INF/container.xml"
+EPUB_ENCRYPTION = "META-INF/encryption.xml"
+NAMESPACE_CONTAINER = "urn:oasis:names:tc:opendocument:xmlns:container"
+NAMESPACE_DC = "http://purl.org/dc/elements/1.1/"
+NAMESPACE_OPF = "http://www.idpf.org/2007/opf"
+NAMESPACE_XMLENC = "http://www.w3.org/2001/04/xmlenc#"
+
+# helper: get the member name referenced by a (relative) URI of an OPF
+# or of META-INF/encryption.xml, whose non-ASCII characters
+# are percent-encoded UTF-8 octets
+def get_uri_member_name(uri):
+    import urllib
+    if (isinstance(uri, unicode)):
+        uri = uri.encode("utf-8")
+    name = urllib.unquote(uri)
+    try:
+        return name.decode("utf-8")
+    except UnicodeDecodeError:
+        return name
+
+# helper: get the (relative) URI referencing the given member name,
+# the inverse of get_uri_member_name
+def get_member_name_uri(name):
+    import urllib
+    if (isinstance(name, unicode)):
+        name = name.encode("utf-8")
+    return urllib.quote(name, safe="/")
+
+# helper: read the OPF file of the EPUB opened as zfile (a ZipFile or an EbookSource),
+# returning [ OPF member name, unique identifier, manifest, spine ],
+# where manifest is a list of [ member name, media type, properties ]
+# and spine is the list of the member names in reading order
+def get_ebook_package(zfile):
+    import posixpath
+    import xml.etree.ElementTree as ET
+    container = ET.fromstring(zfile.read(EPUB_CONTAINER))
+    rootfile = container.find(".//{%s}rootfile" % (NAMESPACE_CONTAINER))
+    if (rootfile == None):
+        raise Exception("No rootfile in '%s'" % (EPUB_CONTAINER))
+    opf_name = rootfile.get("full-path")
+    opf = ET.fromstring(zfile.read(opf_name))
+    uid = None
+    uid_id = opf.get("unique-identifier")
+    for identifier in opf.iter("{%s}identifier" % (NAMESPACE_DC)):
+        if ((uid == None) or (identifier.get("id") == uid_id)):
+            uid = (identifier.text or "").strip()
+    manifest = []
+    ids = {}
+    base = posixpath.dirname(opf_name)
+    for item in opf.iter("{%s}item" % (NAMESPACE_OPF)):
+        name = posixpath.normpath(posixpath.join(base, get_uri_member_name(item.get("href", ""))))
+        manifest.append([name, item.get("media-type", ""), item.get("properties", "").split()])
+        ids[item.get("id")] = name
+    spine = []
+    for itemref in opf.iter("{%s}itemref" % (NAMESPACE_OPF)):
+        if (itemref.get("idref") in ids):
+            spine.append(ids[itemref.get("idref")])
+    return [opf_name, uid, manifest, spine]
+
+# media types of the content documents of an EPUB
+EPUB_CONTENT_MEDIA_TYPES = [
+    "application/xhtml+xml",
+    "application/x-dtbook+xml",
+    "text/html",
+    "text/x-oeb1-document"
+]
+EPUB_NCX_MEDIA_TYPE = "application/x-dtbncx+xml"
+
+# helper: get the names of the members with text to count of the EPUB opened as source
+# (an EbookSource): the spine items, in reading order, then the other content documents
+# in the manifest, except the nav document; with navigation, also the NCX,
+# the nav document, and the OPF (for its metadata)
+def get_ebook_text_member_names(source, navigation=False):
+    opf_name, uid, manifest, spine = get_ebook_package(source)
+    candidates = list(spine)
+    for name, media_type, properties in manifest:
+        if ((media_type in EPUB_CONTENT_MEDIA_TYPES) and (not ("nav" in properties))):
+            candidates.append(name)
+    if (navigation):
+        for name, media_type, properties in manifest:
+            if ((media_type == EPUB_NCX_MEDIA_TYPE) or ("nav" in properties)):
+                candidates.append(name)
+        candidates.append(opf_name)
+    names = []
+    for name in candidates:
+        # the manifest might list remote or missing resources
+        if ((not (name in names)) and (source.exists(name))):
+            names.append(name)
+    return names
+
+# helper: check whether the given manifest item is a font
+def is_font_member(name, media_type):
+    extension = os.path.splitext(name)[1].lower()
+    return ((extension in [".otf", ".ttf", ".woff", ".woff2"]) or ("font" in media_type) or ("opentype" in media_type))
+
+# helper: copy the member described by info from the ZIP file source
+# (a file object) into the ZipFile zout, without recompressing it;
+# zipfile has no public API for this, so the local header is written
+# as ZipFile.writestr() does, from the CRC and sizes already known
+def copy_zip_member(source, info, zout):
+    import copy, struct, zipfile
+    source.seek(info.header_offset)
+    header = struct.unpack(zipfile.structFileHeader, source.read(zipfile.sizeFileHeader))
+    source.seek(header[zipfile._FH_FILENAME_LENGTH] + header[zipfile._FH_EXTRA_FIELD_LENGTH], 1)
+    member = copy.copy(info)
+    # CRC and sizes are in the local header, so no data descriptor follows
+    member.flag_bits &= ~0x08
+    member.header_offset = zout.fp.tell()
+    zout.fp.write(member.FileHeader())
+    remaining = info.compress_size
+    while (remaining > 0):
+        chunk = source.read(min(remaining, 1 << 20))
+        if (len(chunk) == 0):
+            raise Exception("Truncated member '%s'" % (info.filename))
+        zout.fp.write(chunk)
+        remaining -= len(chunk)
+    zout.filelist.append(member)
+    zout.NameToInfo[member.filename] = member
+    zout._didModify = True
+
+
+class BlockIndex:
+
+    # the Unicode blocks, given as [ start hex, stop hex, name ] triples,
+    # precompiled into parallel lists of integers (sorted by start),
+    # so that the block containing a codepoint is found with a bisect,
+    # plus a dictionary from lowercased block name to block position
+
+    __starts = None
+    __stops = None
+    __names = None
+    __positions = None
+
+    def __init__(self, blocks):
+        blocks = sorted([[int(b[0], 16), int(b[1], 16), b[2]] for b in blocks])
+        self.__starts = [b[0] for b in blocks]
+        self.__stops = [b[1] for b in blocks]
+        self.__names = [b[2] for b in blocks]
+        self.__positions = dict([[b[2].lower(), i] for i, b in enumerate(blocks)])
+
+    def __iter__(self):
+        for i in range(len(self.__names)):
+            yield [self.__starts[i], self.__stops[i], self.__names[i]]
+
+    def __len__(self):
+        return len(self.__names)
+
+    # return the position of the block containing codepoint, or -1
+    def get_position(self, codepoint):
+        i = bisect.bisect_right(self.__starts, codepoint) - 1
+        if ((i >= 0) and (codepoint <= self.__stops[i])):
+            return i
+        return -1
+
+    # return the name of the block containing codepoint, or None
+    def get_name(self, codepoint):
+        i = self.get_position(codepoint)
+        if (i >= 0):
+            return self.__names[i]
+        return None
+
+    # return [ start, stop ] of the block with the given name (any case), or None
+    def find(self, name):
+        i = self.__positions.get(name.lower(), -1)
+        if (i >= 0):
+            return [self.__starts[i], self.__stops[i]]
+        return None
+
+
+class RangeCharList:
+
+    # a lazy list of [ character, 1 ] for the codepoints in a CodepointSet,
+    # sorted by codepoint, which can be iterated more than once
+    # (e.g., to print it and then to create an EPUB)
+    # without materializing one list per character
+
+    __codepoint_set = None
+
+    def __init__(self, codepoint_set):
+        self.__codepoint_set = codepoint_set
+
+    def __iter__(self):
+        for c in self.__codepoint_set:
+            yield [unichr(c), 1]
+
+    def __len__(self):
+        return len(self.__codepoint_set)
+
+
+class CharListWriter:
+
+    # write a list of characters (or of [ character, count ])
+    # to a stream, in one of the FORMATS:
+    # rows are formatted in batches of BATCH_SIZE
+    # and written as a single string, encoded with the given encoding,
+    # escaping the characters it cannot represent
+    # (unless the stream is a codecs writer, which encodes by itself)
+
+    FORMAT_TEXT = "text"
+    FORMAT_TSV = "tsv"
+    FORMAT_JSONL = "jsonl"
+    FORMAT_CSV = "csv"
+    FORMATS = [ FORMAT_TEXT, FORMAT_TSV, FORMAT_JSONL, FORMAT_CSV ]
+
+    # fields of the machine readable formats
+    FIELDS = [ "character", "codepoint", "hex", "name", "block", "count" ]
+
+    BATCH_SIZE = 4096
+
+    # escape control characters in text format, as the C escapes
+    ESCAPE_TEXT = dict([
+        [0x00, u"\\0"],
+        [0x07, u"\\a"],
+        [0x08, u"\\b"],
+        [0x09, u"\\t"],
+        [0x0a, u"\\n"],
+        [0x0b, u"\\v"],
+        [0x0c, u"\\f"],
+        [0x0d, u"\\r"]
+    ])
+
+    # escape the characters which would break a TSV row
+    ESCAPE_TSV = dict([
+        [0x09, u"\\t"],
+        [0x0a, u"\\n"],
+        [0x0d, u"\\r"],
+        [0x5c, u"\\\\"]
+    ])
+
+    __stream = None
+    __output_format = None
+    __quiet = False
+    __encoding = None
+    __get_block_name = None
+    __get_font_name = None
+    __rows = None
+    __json = None
+
+    # if get_font_name is given, machine readable formats
+    # have an additional field "font", with the font rendering each character
+    def __init__(self, stream, output_format=FORMAT_TEXT, quiet=False, encoding="utf-8", get_block_name=None, get_font_name=None):
+        self.__stream = stream
+        self.__output_format = output_format
+        self.__quiet = quiet
+        self.__encoding = encoding
+        self.__get_block_name = get_block_name
+        self.__get_font_name = get_font_name
+        self.__rows = []
+        fields = self.FIELDS
+        if (get_font_name != None):
+            fields = fields + ["font"]
+        if (output_format == self.FORMAT_JSONL):
+            import json
+            self.__json = json
+        if (output_format == self.FORMAT_TSV):
+            self.__rows.append(u"\t".join(fields) + u"\n")
+        if (output_format == self.FORMAT_CSV):
+            self.__rows.append(u",".join(fields) + u"\r\n")
+
+    # write the given characters (or [ character, count ])
+    def write(self, chars):
+        rows = self.__rows
+        for c in chars:
+            rows.append(self.__format(c))
+            if (len(rows) >= self.BATCH_SIZE):
+                self.flush()
+                rows = self.__rows
+
+    # write the formatted rows to the stream
+    def flush(self):
+        if (len(self.__rows) > 0):
+            text = u"".join(self.__rows)
+            self.__rows = []
+            if (isinstance(self.__stream, codecs.StreamWriter)):
+                self.__stream.write(text)
+            else:
+                self.__stream.write(text.encode(self.__encoding, "backslashreplace"))
+        self.__stream.flush()
+
+    def __format(self, c):
+        char = c[0]
+        codepoint = ord(char)
+        count = None
+        if (type(c) is list):
+            # c = [ char, count ]
+            count = c[1]
+        if (self.__output_format == self.FORMAT_TEXT):
+            if (self.__quiet):
+                return u"%s\n" % (codepoint)
+            name = unicodedata.name(char, u"UNKNOWN NAME")
+            if (count == None):
+                return u"'%s'\t%s\t%s\t%s\n" % (char.translate(self.ESCAPE_TEXT), codepoint, hex(codepoint), name)
+            return u"'%s'\t%s\t%s\t%s\t%s\n" % (char.translate(self.ESCAPE_TEXT), codepoint, hex(codepoint), name, count)
+        name = unicodedata.name(char, u"")
+        block = u""
+        if (self.__get_block_name != None):
+            block = self.__get_block_name(codepoint)
+        if (self.__output_format == self.FORMAT_JSONL):
+            # Unicode and block names contain only letters, digits, spaces and hyphens,
+            # so only the character and the count need to be serialized;
+            # the fields are written in the FIELDS order
+            row = u"{\"character\": %s, \"codepoint\": %s, \"hex\": \"%s\", \"name\": \"%s\", \"block\": \"%s\", \"count\": %s" % (self.__json.dumps(char, ensure_ascii=False), codepoint, hex(codepoint), name, block, self.__json.dumps(count))
+            if (self.__get_font_name != None):
+                row += u", \"font\": %s" % (self.__json.dumps(self.__get_font_name(codepoint), ensure_ascii=False))
+            return row + u"}\n"
+        values = [char, unicode(codepoint), unicode(hex(codepoint)), unicode(name), unicode(block), u"" if (count == None) else unicode(count)]
+        if (self.__get_font_name != None):
+            values.append(unicode(self.__get_font_name(codepoint) or u""))
+        if (self.__output_format == self.FORMAT_TSV):
+            return u"\t".join([v.translate(self.ESCAPE_TSV) for v in values]) + u"\n"
+        # CSV (RFC 4180): quote the fields containing separators or quotes
+        for i in range(len(values)):
+            v = values[i]
+            if ((u"," in v) or (u"\"" in v) or (u"\n" in v) or (u"\r" in v)):
+                values[i] = u"\"" + v.replace(u"\"", u"\"\"") + u"\""
+        return u",".join(values) + u"\r\n"
+
+
+
 class GlyphIgo:
 
+    # the BlockIndex of UNICODE_BLOCKS, built on first use
+    __block_index = None
+
+    # the UnicodeNameIndex and the codepoint sets of the fonts read so far,
+    # kept in memory by a server (see serve) between requests
+    __name_index = None
+    __font_codepoint_sets = {}
+
+    # set if the specimen font could not be embedded in the EPUB
+    __specimen_failed = False
+
     # match 0x???? or x???? or ????
     PATTERN_HEX_0x = r"^0x[0-9A-Fa-f]+$"
     PATTERN_HEX_x = r"^x[0-9A-Fa-f]+$"
@@ -783,48 +2639,144 @@ class GlyphIgo:
     ]
 
     __args = None
+    __pool = None
 
     def __init__(self, args):
         self.__args = args
 
+    # helper: write a message, which might contain non-ASCII names, to stream,
+    # encoded in UTF-8 (as the character lists) unless the stream
+    # already encodes it (e.g., in a server)
+    def __write_message(self, stream, s):
+        if (isinstance(stream, codecs.StreamWriter)):
+            if (not isinstance(s, unicode)):
+                s = s.decode("utf-8", "replace")
+        elif (isinstance(s, unicode)):
+            s = s.encode("utf-8")
+        stream.write(s)
+
     def __print_error(self, s):
-        sys.stderr.write("[ERROR] %s\n" % (s))
+        self.__write_message(sys.stderr, "[ERROR] %s\n" % (s))
 
     def __print_info(self, s):
-        if not (("quiet" in self.__args) or ("nohumanreadable" in self.__args)):
-            print "[INFO] %s" % (s)
-
-    def __get_ebook_char_list(self):
-        # TODO allow full EPUB parsing
-        text = ""
-        zfile = zipfile.ZipFile(self.__args.ebook)
-        for name in zfile.namelist():
-            if ((name.lower().endswith(".xhtml")) or
-                (name.lower().endswith(".html")) or
-                ((name.lower().endswith(".xml")) and (not name.startswith("META-INF")))):
-                file_bytes = zfile.read(name)
-                try:
-                    # TODO check if utf-8 is always ok
-                    text += file_bytes.decode('utf-8')
-                except:
-                    continue
-        zfile.close()
-        return self.__clean_text(text)
+        # machine readable formats are never interleaved with messages
+        if not (("quiet" in self.__args) or ("nohumanreadable" in self.__args) or (("format" in self.__args) and (self.__args.format != CharListWriter.FORMAT_TEXT))):
+            self.__write_message(sys.stdout, "[INFO] %s\n" % (s))
+
+    def __get_ebook_char_list(self, ebook_file=None):
+        names, histograms = self.__get_ebook_member_histograms(ebook_file)
+        histogram = collections.Counter()
+        for name in names:
+            histogram.update(histograms[name])
+        return self.__get_histogram_char_list(histogram)
+
+    # helper: count the characters in each member of an ebook, in a single pass,
+    # returning [ member names (in reading order), { member name: histogram } ]
+    def __get_ebook_member_histograms(self, ebook_file=None):
+        if (ebook_file == None):
+            ebook_file = self.__args.ebook
+        preserve = ("preserve" in self.__args)
+        source = EbookSource(ebook_file)
+        all_names = source.get_names("navigation" in self.__args)
+        names = all_names
+        histograms = {}
+
+        # with a manifest, count only the members changed since the last run
+        manifest = None
+        if ("manifest" in self.__args):
+            manifest = EbookManifest(self.__args.manifest, preserve)
+            signatures = {}
+            changed = []
+            for name in names:
+                signatures[name] = source.get_signature(name)
+                h = manifest.get_histogram(name, signatures[name])
+                if (h == None):
+                    changed.append(name)
+                else:
+                    histograms[name] = h
+            self.__print_info("Reading %d of %d member(s) of '%s', the others are unchanged in manifest '%s'." % (len(changed), len(names), ebook_file, self.__args.manifest))
+            names = changed
+
+        if (self.__get_jobs() > 1):
+            # split the members into one bin per job,
+            # balancing their uncompressed sizes
+            bins = []
+            for i in range(self.__get_jobs()):
+                bins.append([0, []])
+            for size, name in sorted([[source.get_size(name), name] for name in names], key=lambda x: (-x[0], x[1])):
+                target = min(bins, key=lambda x: x[0])
+                target[0] += size
+                target[1].append(name)
+            jobs = [[ebook_file, b[1], preserve] for b in bins if (len(b[1]) > 0)]
+        else:
+            jobs = [[ebook_file, names, preserve]]
+        source.close()
+        for job_histograms in self.__map(get_ebook_member_histograms, jobs):
+            histograms.update(job_histograms)
+        if (manifest != None):
+            for name in names:
+                manifest.set_histogram(name, signatures[name], histograms[name])
+            manifest.save()
+        return [all_names, histograms]
+
+    # helper: get the merged list of characters of all the ebooks in BATCH
+    def __get_batch_char_list(self):
+        histogram = collections.Counter()
+        jobs = [[ebook_file, ("preserve" in self.__args), ("navigation" in self.__args)] for ebook_file in self.__get_batch_ebook_list()]
+        for [ebook_file, preserve, navigation], [h, error] in itertools.izip(jobs, self.__map(get_ebook_histogram, jobs)):
+            if (error != None):
+                raise Exception("Unable to read ebook '%s': %s" % (ebook_file, error))
+            histogram.update(h)
+        return self.__get_histogram_char_list(histogram)
+
+    # helper: get the number of worker processes
+    def __get_jobs(self):
+        if ("jobs" in self.__args):
+            return int(self.__args.jobs)
+        return 1
+
+    # helper: apply function to each job, in a pool of worker processes
+    # if JOBS is greater than one, returning the results in job order
+    def __map(self, function, jobs):
+        if ((self.__get_jobs() < 2) or (len(jobs) < 2)):
+            return itertools.imap(function, jobs)
+        if (self.__pool == None):
+            import multiprocessing
+            self.__pool = multiprocessing.Pool(self.__get_jobs())
+        return self.__pool.imap(function, jobs)
 
     def __get_font_char_list(self, only_chars=False):
-        chars = []
-        font = fontforge.open(self.__args.font)
-        for x in font.glyphs():
-            if (x.unicode > -1):
-                c = unichr(x.unicode)
-                if (only_chars):
-                    chars.append(c)
-                else:
-                    chars.append([c, 1])
-        return chars
+        return self.__get_char_list(self.__get_font_codepoint_set(), only_chars)
+
+    def __get_font_codepoint_set(self, font_file=None):
+        if (font_file == None):
+            font_file = self.__args.font[0]
+        if ("nocache" in self.__args):
+            return self.__read_font_codepoint_set(font_file)
+        stat = os.stat(font_file)
+        key = (os.path.abspath(font_file), stat.st_size, stat.st_mtime)
+        if (not (key in GlyphIgo.__font_codepoint_sets)):
+            GlyphIgo.__font_codepoint_sets[key] = FontCache().get_codepoint_set(font_file, self.__read_font_codepoint_set)
+        return GlyphIgo.__font_codepoint_sets[key]
+
+    # helper: read the codepoint set of font_file from its cmap table,
+    # or with fontforge if the cmap cannot be read (e.g., for SFD or Type 1 fonts)
+    def __read_font_codepoint_set(self, font_file):
+        try:
+            return CmapReader(font_file).get_codepoint_set()
+        except Exception:
+            if (import_optional("fontforge") == None):
+                raise
+        font = self.__get_fontforge().open(font_file)
+        codepoint_set = CodepointSet([x.unicode for x in font.glyphs() if (x.unicode > -1)])
+        font.close()
+        return codepoint_set
 
     def __get_glyphs_char_list(self, only_chars=False):
-        chars = []
+        return self.__get_char_list(self.__get_glyphs_codepoint_set(), only_chars)
+
+    def __get_glyphs_codepoint_set(self):
+        codepoints = []
         decode = "utf-8"
         if ("decode" in self.__args):
             decode = self.__args.decode
@@ -834,15 +2786,69 @@ class GlyphIgo:
         for g in text.splitlines():
             if ((len(g) > 0) and (g[0] != "#")):
                 if ((len(g) > 2) and (g[0:2] == "0x")):
-                    c = unichr(int(g[2:], 16))
+                    codepoints.append(int(g[2:], 16))
                 elif ((len(g) > 1) and (g[0] == "x")):
-                    c = unichr(int(g[1:], 16))
-                else:
-                    c = unichr(int(g))
-                if (only_chars):
-                    chars.append(c)
+                    codepoints.append(int(g[1:], 16))
                 else:
-                    chars.append([c, 1])
+                    codepoints.append(int(g))
+        return CodepointSet(codepoints)
+
+    # helper: get the codepoint set of the font given
+    # either as FONT or as GLYPHS
+    def __get_source_codepoint_set(self):
+        if ("font" in self.__args):
+            return self.__get_font_codepoint_set()
+        return self.__get_glyphs_codepoint_set()
+
+    # helper: get the fontforge module, required by some commands
+    def __get_fontforge(self):
+        fontforge = import_optional("fontforge")
+        if (fontforge == None):
+            raise Exception("This command requires the Python module 'fontforge'")
+        return fontforge
+
+    # helper: get the list of ebook files in BATCH,
+    # either a directory (all the .epub files it contains)
+    # or a plain text file (one path per line,
+    # relative to the directory containing BATCH)
+    def __get_batch_ebook_list(self):
+        ebooks = []
+        batch = self.__args.batch
+        if (os.path.isdir(batch)):
+            for root, dirs, files in os.walk(batch):
+                dirs.sort()
+                for name in sorted(files):
+                    if (name.lower().endswith(".epub")):
+                        ebooks.append(os.path.join(root, name))
+        else:
+            base = os.path.dirname(batch)
+            f = codecs.open(batch, "r", "utf-8")
+            for line in f.read().splitlines():
+                line = line.strip()
+                if ((len(line) > 0) and (line[0] != "#")):
+                    ebooks.append(os.path.join(base, line))
+            f.close()
+        return ebooks
+
+    # helper: get the list of characters of ebook_char_list
+    # not contained in font_codepoint_set
+    # (control characters are never reported as missing)
+    def __get_missing_char_list(self, ebook_char_list, font_codepoint_set):
+        missing_codepoint_set = self.__get_codepoint_set(ebook_char_list).difference(font_codepoint_set)
+        return filter(lambda x: (ord(x[0]) > 31) and (ord(x[0]) in missing_codepoint_set), ebook_char_list)
+
+    # helper: get the codepoint set of a list of characters
+    def __get_codepoint_set(self, char_list):
+        return CodepointSet([ord(c[0]) for c in char_list])
+
+    # helper: convert a codepoint set into a list of characters
+    def __get_char_list(self, codepoint_set, only_chars=False):
+        chars = []
+        for i in codepoint_set:
+            if (only_chars):
+                chars.append(unichr(i))
+            else:
+                chars.append([unichr(i), 1])
         return chars
 
     def __get_plain_char_list(self):
@@ -850,146 +2856,101 @@ class GlyphIgo:
         if ("decode" in self.__args):
             decode = self.__args.decode
         f = codecs.open(self.__args.plain, "r", decode, "ignore")
-        text = f.read()
+        histogram = get_file_histogram(f, ("preserve" in self.__args))
         f.close()
-        return self.__clean_text(text)
+        return self.__get_histogram_char_list(histogram)
 
+    # helper: get the (lazy) list of characters in the given ranges
+    # and/or Unicode blocks, separated by commas
     def __get_range_char_list(self):
-        query = self.__args.range.lower()
-        
         opt = [
                 [self.PATTERN_RANGE_HEX_0x, 16], 
                 [self.PATTERN_RANGE_HEX_x, 16], 
                 [self.PATTERN_RANGE_DEC, 10]
               ]
 
-        for o in opt:
-            m = re.match(o[0], query)
-            if (m != None):
-                start = int(m.group(1), o[1])
-                stop = int(m.group(2), o[1])
-                return self.__get_range(start, stop)
-       
-        # lookup for Unicode block name
-        for b in self.UNICODE_BLOCKS:
-            if (b[2].lower() == query):
-                start = int(b[0], 16)
-                stop = int(b[1], 16)
-                return self.__get_range(start, stop)
-
-        return []
-
-    # helper: generate a list of Unicode characters
-    # whose codepoint is between start and stop
-    def __get_range(self, start, stop):
-        chars = []
-        for i in range(start, stop + 1):
-            chars.append([unichr(i), 1])
-        return chars
+        ranges = []
+        for query in self.__args.range.split(","):
+            query = query.strip().lower()
+            found = False
+            for o in opt:
+                m = re.match(o[0], query)
+                if (m != None):
+                    start = int(m.group(1), o[1])
+                    stop = int(m.group(2), o[1])
+                    if (start > stop):
+                        raise Exception("Range '%s' starts after its end" % (query))
+                    if (stop > 0x10FFFF):
+                        raise Exception("Range '%s' exceeds the last Unicode codepoint 0x10FFFF" % (query))
+                    ranges.append([start, stop])
+                    found = True
+                    break
 
-    # helper: clean text and produce a list of character,
-    # each with its number of occurrences
-    def __clean_text(self, text):
-        def remove_tags(s):
-            #TODO improve this?
-            s = s.replace("\n", " ")
-            s = s.replace("\r", " ")
-            s = re.sub(r"[ ]+", " ", s)
-            s = re.sub(r"<[^>]+>", "", s)
-            return s
-
-        def decode_xml_entities(s):
-            def fix(m):
-                c = m.group(1)
-                # escape the escape sequences
-                if (c == "amp"):
-                    return "&"
-                if (c == "lt"):
-                    return "<"
-                if (c == "gt"):
-                    return ">"
-                if (c in htmlentitydefs.name2codepoint):
-                    # named entity
-                    return unichr(htmlentitydefs.name2codepoint[c])
-                else:
-                    # TODO this is ugly
-                    if ((c[0] == "#") and len(c) > 1):
-                        # numeric
-                        if ((c[1] == "x") and (len(c) > 2)):
-                            try:
-                                i = int(c[2:], 16)
-                                return unichr(i)
-                            except:
-                                # error
-                                return ''
-                        else:
-                            try:
-                                i = int(c[1:])
-                                return unichr(i)
-                            except:
-                                # error
-                                return ''
-                    # error!
-                    return ''
-
-            return re.sub(r"&([#a-z0-9]+);", fix, s)
-
-        def filter_string(s):
-            mydict = collections.defaultdict(int)
-            for mychar in s:
-                mydict[mychar] += 1
-            mylist = []
-            for mychar in sorted(mydict.keys()):
-                mylist.append([ mychar, mydict[mychar] ])
-            return mylist
-        
-        if (not ("preserve" in self.__args)):
-            text = remove_tags(text)
-        text = decode_xml_entities(text)
-        chars = filter_string(text)
+            if (not found):
+                # lookup for Unicode block name
+                block = self.__get_block_index().find(query)
+                if (block == None):
+                    raise Exception("Unknown range or Unicode block '%s'" % (query))
+                ranges.append(block)
+
+        return RangeCharList(CodepointSet.from_ranges(ranges))
+
+    # helper: convert a histogram into a list of [character, count],
+    # sorted by character
+    def __get_histogram_char_list(self, histogram):
+        chars = []
+        for c in sorted(histogram.keys()):
+            chars.append([c, histogram[c]])
         return chars
    
+    # helper: get the BlockIndex of UNICODE_BLOCKS,
+    # shared by all the instances (the table never changes)
+    def __get_block_index(self):
+        if (GlyphIgo.__block_index == None):
+            GlyphIgo.__block_index = BlockIndex(self.UNICODE_BLOCKS)
+        return GlyphIgo.__block_index
+
+    # helper: get the name of the Unicode block containing codepoint
+    def __get_block_name(self, codepoint):
+        name = self.__get_block_index().get_name(codepoint)
+        if (name == None):
+            return "No Block"
+        return name
+
     # helper: pretty print Unicode blocks list
     def __print_block_list(self):
         self.__print_info("Range\tStart\tStop\tStart\tStop\tName")
-        for b in self.UNICODE_BLOCKS:
-            print "0x%s-0x%s\t0x%s\t0x%s\t%s\t%s\t%s" % (b[0], b[1], b[0], b[1], int(b[0], 16), int(b[1], 16), b[2])
+        for start, stop, name in self.__get_block_index():
+            print "0x%04x-0x%04x\t0x%04x\t0x%04x\t%s\t%s\t%s" % (start, stop, start, stop, start, stop, name)
 
     # helper: pretty print char list
-    def __print_char_list(self, chars):
-        def escape(s):
-            repl = [
-                ["\0", "\\0"],
-                ["\a", "\\a"],
-                ["\b", "\\b"],
-                ["\t", "\\t"],
-                ["\n", "\\n"],
-                ["\v", "\\v"],
-                ["\f", "\\f"],
-                ["\r", "\\r"]
-            ]
-            for r in repl:
-                s = s.replace(r[0], r[1])
-            return s
-        
-        if ("sort" in self.__args):
+    def __print_char_list(self, chars, get_font_name=None):
+        output_format = CharListWriter.FORMAT_TEXT
+        if ("format" in self.__args):
+            output_format = self.__args.format
+        encoding = "utf-8"
+        if ("encoding" in self.__args):
+            encoding = self.__args.encoding
+        writer = CharListWriter(sys.stdout, output_format, ("quiet" in self.__args), encoding, self.__get_block_name, get_font_name)
+
+        if (("sort" in self.__args) and (type(chars) is list)):
+            # a RangeCharList has all counts equal to 1, nothing to sort
             chars.sort(key=lambda x: -x[1])
-        if ("quiet" in self.__args):
+        if ("group" in self.__args):
+            # group characters by Unicode block,
+            # keeping the current order inside each block
+            groups = collections.defaultdict(list)
+            get_position = self.__get_block_index().get_position
             for c in chars:
-                decCodePoint = ord(c[0])
-                print "%s" % (decCodePoint)
+                groups[get_position(ord(c[0]))].append(c)
+            for position in sorted(groups.keys(), key=lambda x: min(map(lambda c: ord(c[0]), groups[x]))):
+                chars = groups[position]
+                writer.flush()
+                self.__print_info("Block '%s' (%s characters):" % (self.__get_block_name(ord(chars[0][0])), len(chars)))
+                writer.write(chars)
         else:
-            for c in chars:
-                name = unicodedata.name(c[0], 'UNKNOWN NAME')
-                decCodePoint = ord(c[0])
-                hexCodePoint = hex(decCodePoint)
-                if (type(c) is list):
-                    # c = [ char, count ]
-                    count = c[1]
-                    print "'%s'\t%s\t%s\t%s\t%s" % (escape(c[0]), decCodePoint, hexCodePoint, name, count)
-                else:
-                    # c is a char
-                    print "'%s'\t%s\t%s\t%s" % (escape(c[0]), decCodePoint, hexCodePoint, name)
+            writer.write(chars)
+        writer.flush()
 
     # helper: get the file path for output path
     # either from "output" or from the original input file + prefix
@@ -1002,56 +2963,122 @@ class GlyphIgo:
 
     # helper: obfuscate a font
     def __obfuscate_font(self):
-        def get_obfuscation_header_size(idpf_algorithm=True):
-            if (idpf_algorithm):
-                return [52, 20]
-            else:
-                return [64, 16]
-
-        def get_obfuscation_key(key, idpf_algorithm=True):
-            k = key
-            if (idpf_algorithm):
-                k = k.replace(u"\u0020", "")
-                k = k.replace(u"\u0009", "")
-                k = k.replace(u"\u000d", "")
-                k = k.replace(u"\u000a", "")
-                d = hashlib.sha1(k).digest()
-            else:
-                k = k.replace(u"urn:uuid:", "")
-                k = k.replace(u"-", "")
-                k = k.replace(u":", "")
-                d = k 
-            return str(d)
- 
-        f = open(self.__args.font, 'rb')
-        fontData = bytearray(f.read())
-        f.close()
-        obfuscatedFontFile = self.__get_name_output_file(self.__args.font, prefix="obfuscated_")
-        d = open(obfuscatedFontFile, 'wb')
+        obfuscatedFontFile = self.__get_name_output_file(self.__args.font[0], prefix="obfuscated_")
         idpf_algorithm = True
         algorithm_label = "IDPF"
         if ("adobe" in self.__args):
             idpf_algorithm = False
             algorithm_label = "Adobe"
-        keyData = bytearray(get_obfuscation_key(self.__args.id, idpf_algorithm))
-        keySize = len(keyData)
-        i = 0
-        outer = 0
-        outer_max, inner_max = get_obfuscation_header_size(idpf_algorithm)
-        while (outer < outer_max) and (i < len(fontData)):
-            inner = 0
-            while (inner < inner_max) and (i < len(fontData)):
-                sourceByte = fontData[i]
-                keyByte = keyData[inner % keySize]
-                obfuscatedByte = sourceByte ^ keyByte
-                d.write(chr(obfuscatedByte))
-                inner += 1
-                i += 1
-            outer += 1
-        if (i < len(fontData) - 1):
-            d.write(fontData[i:])
-        d.close()
-        self.__print_info("(De)obfuscated font '%s' into '%s' using id '%s' and %s algorithm." % (self.__args.font, obfuscatedFontFile, self.__args.id, algorithm_label))
+        mask = get_obfuscation_mask(self.__args.id, idpf_algorithm)
+        f = open(self.__args.font[0], 'rb')
+        d = open(obfuscatedFontFile, 'wb')
+        try:
+            obfuscate_font_stream(f, d, mask)
+        finally:
+            d.close()
+            f.close()
+        self.__print_info("(De)obfuscated font '%s' into '%s' using id '%s' and %s algorithm." % (self.__args.font[0], obfuscatedFontFile, self.__args.id, algorithm_label))
+
+    # helper: (de)obfuscate the fonts inside an EPUB file, in a single pass:
+    # the fonts are rewritten, META-INF/encryption.xml is updated,
+    # and all the other members are copied without recompressing them
+    def __obfuscate_ebook(self):
+        import cStringIO, zipfile
+        import xml.etree.ElementTree as ET
+        ebook_file = self.__args.ebook
+        output_file = ebook_file
+        if ("output" in self.__args):
+            output_file = self.__args.output
+        idpf_algorithm = not ("adobe" in self.__args)
+
+        source = open(ebook_file, "rb")
+        zin = zipfile.ZipFile(source)
+        opf_name, uid, manifest, spine = get_ebook_package(zin)
+        key = uid
+        if ("id" in self.__args):
+            key = self.__args.id
+        if (not key):
+            raise Exception("Unable to find the unique identifier in '%s', use option '--id'" % (opf_name))
+        names = zin.namelist()
+
+        # fonts already obfuscated, as listed in META-INF/encryption.xml
+        if (EPUB_ENCRYPTION in names):
+            encryption = ET.fromstring(zin.read(EPUB_ENCRYPTION))
+        else:
+            encryption = ET.Element("{%s}encryption" % (NAMESPACE_CONTAINER))
+        obfuscated = {}
+        for data in list(encryption.findall("{%s}EncryptedData" % (NAMESPACE_XMLENC))):
+            method = data.find("{%s}EncryptionMethod" % (NAMESPACE_XMLENC))
+            reference = data.find("{%s}CipherData/{%s}CipherReference" % (NAMESPACE_XMLENC, NAMESPACE_XMLENC))
+            if ((method == None) or (reference == None) or (not (method.get("Algorithm") in OBFUSCATION_ALGORITHMS))):
+                # really encrypted resources are left untouched
+                continue
+            obfuscated[get_uri_member_name(reference.get("URI", ""))] = [OBFUSCATION_ALGORITHMS[method.get("Algorithm")], data]
+
+        # fonts to rewrite: member name -> idpf_algorithm
+        targets = {}
+        if ("deobfuscate" in self.__args):
+            for name in obfuscated:
+                if (name in names):
+                    targets[name] = obfuscated[name][0]
+                    encryption.remove(obfuscated[name][1])
+        else:
+            for name, media_type, properties in manifest:
+                if ((name in names) and (is_font_member(name, media_type)) and (not (name in obfuscated))):
+                    targets[name] = idpf_algorithm
+                    algorithm = [a for a in OBFUSCATION_ALGORITHMS if (OBFUSCATION_ALGORITHMS[a] == idpf_algorithm)][0]
+                    data = ET.SubElement(encryption, "{%s}EncryptedData" % (NAMESPACE_XMLENC))
+                    ET.SubElement(data, "{%s}EncryptionMethod" % (NAMESPACE_XMLENC), Algorithm=algorithm)
+                    cipher = ET.SubElement(data, "{%s}CipherData" % (NAMESPACE_XMLENC))
+                    ET.SubElement(cipher, "{%s}CipherReference" % (NAMESPACE_XMLENC), URI=get_member_name_uri(name))
+
+        if (len(targets) == 0):
+            zin.close()
+            source.close()
+            self.__print_info("No font to (de)obfuscate in '%s'." % (ebook_file))
+            return
+
+        ET.register_namespace("", NAMESPACE_CONTAINER)
+        ET.register_namespace("enc", NAMESPACE_XMLENC)
+        encryption_data = None
+        if (len(encryption) > 0):
+            encryption_data = '<?xml version="1.0" encoding="UTF-8"?>\n' + ET.tostring(encryption, encoding="utf-8").split("?>", 1)[-1].lstrip()
+
+        tmp_file = "%s.%s.tmp" % (output_file, os.getpid())
+        try:
+            zout = zipfile.ZipFile(tmp_file, "w")
+            for info in zin.infolist():
+                if (info.filename in targets):
+                    font = zin.open(info)
+                    buf = cStringIO.StringIO()
+                    obfuscate_font_stream(font, buf, get_obfuscation_mask(key, targets[info.filename]))
+                    font.close()
+                    member = zipfile.ZipInfo(info.filename, info.date_time)
+                    member.compress_type = info.compress_type
+                    member.external_attr = info.external_attr
+                    zout.writestr(member, buf.getvalue())
+                    self.__print_info("(De)obfuscated font '%s' using id '%s' and %s algorithm." % (info.filename, key, "IDPF" if targets[info.filename] else "Adobe"))
+                elif (info.filename == EPUB_ENCRYPTION):
+                    if (encryption_data != None):
+                        member = zipfile.ZipInfo(info.filename, info.date_time)
+                        member.compress_type = zipfile.ZIP_DEFLATED
+                        zout.writestr(member, encryption_data)
+                        encryption_data = None
+                else:
+                    copy_zip_member(source, info, zout)
+            if (encryption_data != None):
+                zout.writestr(EPUB_ENCRYPTION, encryption_data, zipfile.ZIP_DEFLATED)
+            zout.close()
+            zin.close()
+            source.close()
+            os.rename(tmp_file, output_file)
+        except:
+            zin.close()
+            source.close()
+            if (os.path.exists(tmp_file)):
+                os.remove(tmp_file)
+            raise
+        self.__print_info("(De)obfuscated %d font(s) of '%s' into '%s'." % (len(targets), ebook_file, output_file))
 
     def __print_Unicode_info(self, char, short):
         name = unicodedata.name(char, "UNKNOWN")
@@ -1091,17 +3118,10 @@ class GlyphIgo:
             for q in qw:
                 if (len(q) > 0):
                     effective_qw.append(q)
-            # Unicode codepoints range from 0 to 0x10FFFF = 1114111
-            for i in range(1114112):
-                c = unichr(i)
-                name = unicodedata.name(c, "UNKNOWN").split(" ")
-                is_match = True
-                for e in effective_qw:
-                    if (not (e in name)):
-                        is_match = False
-                        break
-                if (is_match):
-                    results.append(c)
+            if (GlyphIgo.__name_index == None):
+                GlyphIgo.__name_index = UnicodeNameIndex()
+            for i in GlyphIgo.__name_index.lookup(effective_qw):
+                results.append(unichr(i))
         else:
             # try char, codepoint or exact name lookup
             if (len(query) == 1):
@@ -1121,12 +3141,31 @@ class GlyphIgo:
                 results = [ unicodedata.lookup(query) ]
         return results
         
+    # helper: subset FONT with the given codepoints, to embed it in an EPUB;
+    # return [ file name, font data ], or None if no glyph is left
+    def __get_specimen_font(self, codepoints):
+        font_file = self.__args.font[0]
+        try:
+            codepoint_set = CodepointSet(codepoints).intersection(self.__get_font_codepoint_set())
+            if (len(codepoint_set) == 0):
+                self.__print_info("Font '%s' has none of the listed characters, not embedding it in the EPUB." % (font_file))
+                return None
+            extension, data = generate_subset_font(font_file, codepoint_set)
+        except Exception as e:
+            self.__print_error("Cannot embed font '%s' in the EPUB: %s" % (font_file, e))
+            self.__specimen_failed = True
+            return None
+        self.__print_info("Embedding a subset of font '%s' (%s glyphs, %s bytes) in the EPUB." % (font_file, len(codepoint_set), len(data)))
+        return ["specimen" + extension, data]
+
+    # helper: create the EPUB with the characters in char_list,
+    # returning False if the requested specimen font could not be embedded
     def __create_epub(self, char_list):
-        dec_codepoint_list = map(lambda x: ord(x[0]), char_list)
+        dec_codepoint_list = (ord(x[0]) for x in char_list)
         font_name = ""
         ebook_name = ""
         if ("font" in self.__args):
-            font_name = self.__args.font
+            font_name = self.__args.font[0]
         if ("glyphs" in self.__args):
             font_name = self.__args.glyphs
         if ("ebook" in self.__args):
@@ -1147,29 +3186,60 @@ class GlyphIgo:
             epub_title = "Glyphs missing in %s to display %s" % (font_name, ebook_name)
         from genEPUB import genEPUB
         generator = genEPUB()
-        generator.createEPUB(dec_codepoint_list, epub_title, epub_file_name)
+        page_size = genEPUB.PAGE_SIZE
+        if ("page_size" in self.__args):
+            page_size = int(self.__args.page_size)
+        specimen = None
+        self.__specimen_failed = False
+        if ("specimen" in self.__args):
+            specimen = self.__get_specimen_font
+        # a RangeCharList is already sorted by codepoint;
+        # pages are split by Unicode block
+        generator.createEPUB(dec_codepoint_list, epub_title, epub_file_name, sort=(not isinstance(char_list, RangeCharList)), pageSize=page_size, getPageName=self.__get_block_index().get_name, specimen=specimen)
         self.__print_info("Created EPUB file '%s'." % (epub_file_name))
+        return (not self.__specimen_failed)
+
+    def __do_cache(self):
+        cache = FontCache()
+        try:
+            if ("purge" in self.__args):
+                count = cache.purge()
+                self.__print_info("Deleted %s entries from font cache '%s'." % (count, cache.get_directory()))
+                return CustomParser.EXIT_CODE_OK
+            if ("font" in self.__args):
+                for font_file in self.__args.font:
+                    codepoint_set = cache.get_codepoint_set(font_file, self.__read_font_codepoint_set)
+                    self.__print_info("Cached font '%s' (%s glyphs)." % (font_file, len(codepoint_set)))
+                return CustomParser.EXIT_CODE_OK
+            entries = cache.get_entries()
+        except Exception as e:
+            self.__print_error(str(e))
+            return CustomParser.EXIT_CODE_COMMAND_FAILED
+        self.__print_info("Font cache '%s' (%s entries, %s bytes):" % (cache.get_directory(), len(entries), sum(map(lambda x: x[1], entries))))
+        self.__print_info("SHA-1\tBytes\tLast used\tGlyphs\tFont")
+        for sha1, size, mtime, count, font_file in entries:
+            print "%s\t%s\t%s\t%s\t%s" % (sha1, size, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(mtime)), count, font_file)
+        return CustomParser.EXIT_CODE_OK
 
     def __do_check(self):
-        font_char_list = []
+        font_codepoint_set = CodepointSet()
         ebook_char_list = []
         missing_char_list = []
         font_name = ""
         ebook_name = ""
         try:
             if ("font" in self.__args):
-                font_name = self.__args.font
-                font_char_list = self.__get_font_char_list(only_chars=True)
+                font_name = self.__args.font[0]
             if ("glyphs" in self.__args):
                 font_name = self.__args.glyphs
-                font_char_list = self.__get_glyphs_char_list(only_chars=True)
+            font_codepoint_set = self.__get_source_codepoint_set()
             if ("ebook" in self.__args):
                 ebook_name = self.__args.ebook
                 ebook_char_list = self.__get_ebook_char_list()
             if ("plain" in self.__args):
                 ebook_name = self.__args.plain
                 ebook_char_list = self.__get_plain_char_list()
-            missing_char_list = filter(lambda x: (ord(x[0]) > 31) and (x[0] not in font_char_list), ebook_char_list)
+            missing_char_list = self.__get_missing_char_list(ebook_char_list, font_codepoint_set)
         except Exception as e:
             self.__print_error(str(e))
             return CustomParser.EXIT_CODE_COMMAND_FAILED
@@ -1183,15 +3253,117 @@ class GlyphIgo:
                 self.__create_epub(missing_char_list)
             return CustomParser.EXIT_CODE_MISSING_GLYPHS
 
+    # check EBOOK or PLAIN against the fallback stack of fonts
+    # given by repeating FONT (the first font has the highest priority),
+    # printing the characters rendered by each font
+    # and the characters not rendered by any font
+    def __do_check_stack(self):
+        font_files = self.__args.font
+        ebook_name = ""
+        try:
+            stack = FontStack([self.__get_font_codepoint_set(font_file) for font_file in font_files])
+            if ("ebook" in self.__args):
+                ebook_name = self.__args.ebook
+                ebook_char_list = self.__get_ebook_char_list()
+            if ("plain" in self.__args):
+                ebook_name = self.__args.plain
+                ebook_char_list = self.__get_plain_char_list()
+        except Exception as e:
+            self.__print_error(str(e))
+            return CustomParser.EXIT_CODE_COMMAND_FAILED
+
+        # control characters are never reported as missing
+        ebook_char_list = filter(lambda x: (ord(x[0]) > 31), ebook_char_list)
+        rendered = [[] for font_file in font_files]
+        missing_char_list = []
+        for c in ebook_char_list:
+            i = stack.get_font(ord(c[0]))
+            if (i >= 0):
+                rendered[i].append(c)
+            else:
+                missing_char_list.append(c)
+
+        def get_font_name(codepoint):
+            i = stack.get_font(codepoint)
+            if (i >= 0):
+                return font_files[i]
+            return None
+
+        if (("format" in self.__args) and (self.__args.format != CharListWriter.FORMAT_TEXT)):
+            # one row for each character, with the font rendering it
+            self.__print_char_list(ebook_char_list, get_font_name)
+        else:
+            for i in range(len(font_files)):
+                count = sum([c[1] for c in rendered[i]])
+                self.__print_info("Font %d '%s' renders %d characters (%d occurrences) of ebook '%s':" % (i + 1, font_files[i], len(rendered[i]), count, ebook_name))
+                self.__print_char_list(rendered[i])
+            if (len(missing_char_list) == 0):
+                self.__print_info("Fonts %s contain all the glyphs for displaying ebook '%s'." % (", ".join(["'%s'" % (f) for f in font_files]), ebook_name))
+            else:
+                self.__print_info("No font renders the following %d characters of ebook '%s':" % (len(missing_char_list), ebook_name))
+                self.__print_char_list(missing_char_list)
+        if (len(missing_char_list) == 0):
+            return CustomParser.EXIT_CODE_OK
+        if ("epub" in self.__args):
+            self.__create_epub(missing_char_list)
+        return CustomParser.EXIT_CODE_MISSING_GLYPHS
+
+    # check each ebook in BATCH against each font,
+    # reading every font and every ebook only once,
+    # and output one JSON line for each (ebook, font) pair
+    def __do_check_batch(self):
+        import json
+        returnCode = CustomParser.EXIT_CODE_OK
+        font_list = []
+        output = sys.stdout
+        try:
+            ebook_list = self.__get_batch_ebook_list()
+            if ("font" in self.__args):
+                for font_file in self.__args.font:
+                    font_list.append([font_file, self.__get_font_codepoint_set(font_file)])
+            if ("glyphs" in self.__args):
+                font_list.append([self.__args.glyphs, self.__get_glyphs_codepoint_set()])
+            if ("output" in self.__args):
+                output = open(self.__args.output, "w")
+        except Exception as e:
+            self.__print_error(str(e))
+            return CustomParser.EXIT_CODE_COMMAND_FAILED
+        jobs = [[ebook_file, ("preserve" in self.__args), ("navigation" in self.__args)] for ebook_file in ebook_list]
+        for ebook_file, [histogram, error] in itertools.izip(ebook_list, self.__map(get_ebook_histogram, jobs)):
+            if (error == None):
+                ebook_char_list = self.__get_histogram_char_list(histogram)
+            for font_file, font_codepoint_set in font_list:
+                result = collections.OrderedDict()
+                result["ebook"] = ebook_file
+                result["font"] = font_file
+                if (error != None):
+                    result["exit_code"] = CustomParser.EXIT_CODE_COMMAND_FAILED
+                    result["error"] = error
+                else:
+                    missing_char_list = self.__get_missing_char_list(ebook_char_list, font_codepoint_set)
+                    if (len(missing_char_list) == 0):
+                        result["exit_code"] = CustomParser.EXIT_CODE_OK
+                    else:
+                        result["exit_code"] = CustomParser.EXIT_CODE_MISSING_GLYPHS
+                    result["missing_count"] = len(missing_char_list)
+                    result["missing"] = map(lambda x: ord(x[0]), missing_char_list)
+                output.write(json.dumps(result) + "\n")
+                returnCode |= result["exit_code"]
+            output.flush()
+        if (output != sys.stdout):
+            output.close()
+            self.__print_info("Results for %s ebook(s) and %s font(s) written to '%s'." % (len(ebook_list), len(font_list), self.__args.output))
+        return returnCode
+
     def __do_convert(self):
         try:
-            font = fontforge.open(self.__args.font)
+            font = self.__get_fontforge().open(self.__args.font[0])
             font.selection.all()
             font.generate(self.__args.output)
         except Exception as e:
             self.__print_error(str(e))
             return CustomParser.EXIT_CODE_COMMAND_FAILED
-        self.__print_info("Converted font '%s' into font '%s'." % (self.__args.font, self.__args.output))
+        self.__print_info("Converted font '%s' into font '%s'." % (self.__args.font[0], self.__args.output))
         return CustomParser.EXIT_CODE_OK
 
     def __do_count(self):
@@ -1199,6 +3371,9 @@ class GlyphIgo:
         try:
             char_list = []
             ebook_name = ""
+            if ("batch" in self.__args):
+                char_list = self.__get_batch_char_list()
+                ebook_name = self.__args.batch
             if ("ebook" in self.__args):
                 char_list = self.__get_ebook_char_list()
                 ebook_name = self.__args.ebook
@@ -1214,6 +3389,39 @@ class GlyphIgo:
         print total
         return CustomParser.EXIT_CODE_OK
 
+    # print one JSON line for each document of EBOOK, in reading order,
+    # with its number of characters, its histogram (list only),
+    # and the characters appearing in it for the first time
+    def __do_documents(self):
+        import json
+        output = sys.stdout
+        try:
+            names, histograms = self.__get_ebook_member_histograms()
+            if ("output" in self.__args):
+                output = open(self.__args.output, "w")
+        except Exception as e:
+            self.__print_error(str(e))
+            return CustomParser.EXIT_CODE_COMMAND_FAILED
+        seen = set()
+        for position, name in enumerate(names):
+            histogram = histograms[name]
+            first = sorted([c for c in histogram if (not (c in seen))])
+            seen.update(first)
+            result = collections.OrderedDict()
+            result["document"] = name
+            result["position"] = position + 1
+            result["count"] = sum(histogram.values())
+            result["distinct"] = len(histogram)
+            result["first_count"] = len(first)
+            result["first"] = map(ord, first)
+            if (self.__args.command == CustomParser.COMMAND_LIST):
+                result["histogram"] = [[ord(c), histogram[c]] for c in sorted(histogram)]
+            output.write(json.dumps(result) + "\n")
+        if (output != sys.stdout):
+            output.close()
+            self.__print_info("Statistics for %s document(s) of '%s' written to '%s'." % (len(names), self.__args.ebook, self.__args.output))
+        return CustomParser.EXIT_CODE_OK
+
     def __do_list(self):
         char_list = []
         msg = ""
@@ -1223,12 +3431,15 @@ class GlyphIgo:
                 self.__print_info(msg)
                 self.__print_block_list()
                 return CustomParser.EXIT_CODE_OK
+            if ("batch" in self.__args):
+                char_list = self.__get_batch_char_list()
+                msg = "Characters in '%s':" % (self.__args.batch)
             if ("ebook" in self.__args):
                 char_list = self.__get_ebook_char_list()
                 msg = "Characters in '%s':" % (self.__args.ebook)
             if ("font" in self.__args):
                 char_list = self.__get_font_char_list(only_chars=True)
-                msg = "Glyphs in '%s':" % (self.__args.font)
+                msg = "Glyphs in '%s':" % (self.__args.font[0])
             if ("glyphs" in self.__args):
                 char_list = self.__get_glyphs_char_list(only_chars=True)
                 msg = "Glyphs in '%s':" % (self.__args.glyphs)
@@ -1238,13 +3449,29 @@ class GlyphIgo:
             if ("range" in self.__args):
                 char_list = self.__get_range_char_list()
                 msg = "Characters in range '%s':" % (self.__args.range)
+            if (("exclude" in self.__args) and
+                (("font" in self.__args) or ("glyphs" in self.__args)) and
+                (("batch" in self.__args) or ("ebook" in self.__args) or ("plain" in self.__args))):
+                # glyphs in FONT or GLYPHS not used by EBOOK or PLAIN
+                if ("batch" in self.__args):
+                    ebook_name = self.__args.batch
+                    ebook_char_list = self.__get_batch_char_list()
+                elif ("ebook" in self.__args):
+                    ebook_name = self.__args.ebook
+                    ebook_char_list = self.__get_ebook_char_list()
+                else:
+                    ebook_name = self.__args.plain
+                    ebook_char_list = self.__get_plain_char_list()
+                unused_codepoint_set = self.__get_source_codepoint_set().difference(self.__get_codepoint_set(ebook_char_list))
+                char_list = self.__get_char_list(unused_codepoint_set, only_chars=True)
+                msg = "Glyphs in '%s' not used by '%s':" % (self.__args.font[0] if ("font" in self.__args) else self.__args.glyphs, ebook_name)
         except Exception as e:
             self.__print_error(str(e))
             return CustomParser.EXIT_CODE_COMMAND_FAILED
         self.__print_info(msg)
         self.__print_char_list(char_list)
-        if ("epub" in self.__args):
-            self.__create_epub(char_list)
+        if (("epub" in self.__args) and (not self.__create_epub(char_list))):
+            return CustomParser.EXIT_CODE_COMMAND_FAILED
         return CustomParser.EXIT_CODE_OK
 
     def __do_lookup(self):
@@ -1264,38 +3491,35 @@ class GlyphIgo:
 
     def __do_obfuscate(self):
         try:
-            self.__obfuscate_font()
+            if ("ebook" in self.__args):
+                self.__obfuscate_ebook()
+            else:
+                self.__obfuscate_font()
         except Exception as e:
             self.__print_error(str(e))
             return CustomParser.EXIT_CODE_COMMAND_FAILED
         return CustomParser.EXIT_CODE_OK
 
     def __do_subset(self):
-        font_char_list = []
         ebook_char_list = []
         found_char_list = []
         font_name = ""
         ebook_name = ""
         output_font_file = ""
         try:
-            font_name = self.__args.font
-            font_char_list = self.__get_font_char_list(only_chars=True)
+            font_name = self.__args.font[0]
+            font_codepoint_set = self.__get_font_codepoint_set()
             if ("ebook" in self.__args):
                 ebook_name = self.__args.ebook
                 ebook_char_list = self.__get_ebook_char_list()
             if ("plain" in self.__args):
                 ebook_name = self.__args.plain
                 ebook_char_list = self.__get_plain_char_list()
-            font = fontforge.open(self.__args.font)
-            font.selection.none()
-            for c in ebook_char_list:
-                if (c[0] in font_char_list):
-                    font.selection.select(("more", "unicode"), ord(c[0]))
-                    found_char_list.append(c[0])
-            if (not ("exclude" in self.__args)):
-                font.selection.invert()
-            font.clear()
-            output_font_file = self.__get_name_output_file(self.__args.font, prefix="subset_")
+            found_codepoint_set = self.__get_codepoint_set(ebook_char_list).intersection(font_codepoint_set)
+            found_char_list = self.__get_char_list(found_codepoint_set, only_chars=True)
+            font = self.__get_fontforge().open(self.__args.font[0])
+            subset_fontforge_font(font, found_codepoint_set, ("exclude" in self.__args))
+            output_font_file = self.__get_name_output_file(self.__args.font[0], prefix="subset_")
             font.generate(output_font_file)
         except Exception as e:
             self.__print_error(str(e))
@@ -1307,21 +3531,297 @@ class GlyphIgo:
         self.__print_char_list(found_char_list)
         return CustomParser.EXIT_CODE_OK
 
+    # subset each font against each ebook in BATCH,
+    # opening every font only once, in this process,
+    # and output one JSON line for each (ebook, font) pair
+    def __do_subset_batch(self):
+        import json, multiprocessing
+        returnCode = CustomParser.EXIT_CODE_OK
+        output_directory = None
+        try:
+            ebook_list = self.__get_batch_ebook_list()
+            fontforge = self.__get_fontforge()
+            del SUBSET_FONTS[:]
+            for font_file in self.__args.font:
+                SUBSET_FONTS.append([fontforge.open(font_file), self.__get_font_codepoint_set(font_file)])
+            if ("output" in self.__args):
+                output_directory = self.__args.output
+                if (not os.path.isdir(output_directory)):
+                    os.makedirs(output_directory)
+        except Exception as e:
+            self.__print_error(str(e))
+            return CustomParser.EXIT_CODE_COMMAND_FAILED
+
+        # read each ebook only once, for all the fonts
+        histogram_jobs = [[ebook_file, ("preserve" in self.__args), ("navigation" in self.__args)] for ebook_file in ebook_list]
+        ebook_codepoint_sets = []
+        for ebook_file, [histogram, error] in itertools.izip(ebook_list, self.__map(get_ebook_histogram, histogram_jobs)):
+            if (error != None):
+                ebook_codepoint_sets.append([None, error])
+            else:
+                ebook_codepoint_sets.append([CodepointSet([ord(c) for c in histogram]), None])
+
+        # the subset font of ebook "dir/book.epub" and font "font.ttf"
+        # is "book.font.ttf", in OUTPUT (if given) or in "dir";
+        # the ebooks which cannot be read get one error for each font
+        results = []
+        jobs = []
+        for ebook_file, [codepoint_set, error] in itertools.izip(ebook_list, ebook_codepoint_sets):
+            for position in range(len(self.__args.font)):
+                result = collections.OrderedDict()
+                result["ebook"] = ebook_file
+                result["font"] = self.__args.font[position]
+                if (error != None):
+                    result["exit_code"] = CustomParser.EXIT_CODE_COMMAND_FAILED
+                    result["error"] = error
+                    results.append([result, None, None])
+                    continue
+                directory = output_directory
+                if (directory == None):
+                    directory = os.path.dirname(ebook_file)
+                output_file = os.path.join(directory, os.path.splitext(os.path.basename(ebook_file))[0] + "." + os.path.basename(self.__args.font[position]))
+                glyph_count = len(codepoint_set.intersection(SUBSET_FONTS[position][1]))
+                results.append([result, glyph_count, output_file])
+                jobs.append([position, codepoint_set, ("exclude" in self.__args), output_file])
+
+        # fonts cannot be pickled, nor cloned: worker processes are forked
+        # after opening them, and each one is used for a single subset
+        pool = multiprocessing.Pool(self.__get_jobs(), maxtasksperchild=1)
+        try:
+            subsets = pool.imap(subset_font_with_codepoints, jobs)
+            for result, glyph_count, output_file in results:
+                if (output_file != None):
+                    size, error = subsets.next()
+                    if (error != None):
+                        result["exit_code"] = CustomParser.EXIT_CODE_COMMAND_FAILED
+                        result["error"] = error
+                    else:
+                        result["exit_code"] = CustomParser.EXIT_CODE_OK
+                        result["output"] = output_file
+                        result["glyph_count"] = glyph_count
+                print json.dumps(result)
+                sys.stdout.flush()
+                returnCode |= result["exit_code"]
+        finally:
+            pool.close()
+            pool.join()
+        return returnCode
+
+    # plan the subsets of FONT for the ebooks in BATCH (e.g., a series):
+    # report the overlap between their character sets
+    # and the estimated size of one subset per ebook, of one shared subset,
+    # and (with BUDGET) of the fewest clustered subsets each within BUDGET bytes;
+    # with OUTPUT, generate the shared (or clustered) subsets into OUTPUT
+    def __do_subset_plan(self):
+        returnCode = CustomParser.EXIT_CODE_OK
+        font_file = self.__args.font[0]
+        budget = None
+        if ("budget" in self.__args):
+            budget = int(self.__args.budget)
+        ebooks = []
+        try:
+            estimator = SubsetSizeEstimator(font_file)
+            font_codepoint_set = self.__get_font_codepoint_set(font_file)
+            ebook_list = self.__get_batch_ebook_list()
+            jobs = [[ebook_file, ("preserve" in self.__args), ("navigation" in self.__args)] for ebook_file in ebook_list]
+            for ebook_file, [histogram, error] in itertools.izip(ebook_list, self.__map(get_ebook_histogram, jobs)):
+                if (error != None):
+                    raise Exception("Unable to read ebook '%s': %s" % (ebook_file, error))
+                ebooks.append([ebook_file, CodepointSet([ord(c) for c in histogram]).intersection(font_codepoint_set)])
+        except Exception as e:
+            self.__print_error(str(e))
+            return CustomParser.EXIT_CODE_COMMAND_FAILED
+
+        union = CodepointSet()
+        for ebook_file, codepoint_set in ebooks:
+            union = union.union(codepoint_set)
+        self.__print_info("Glyphs of font '%s' used by %d ebook(s): %d in total." % (font_file, len(ebooks), len(union)))
+
+        # calibrate the estimates against a real subset of all the glyphs used
+        if ((len(union) > 0) and (import_optional("fontforge") != None)):
+            try:
+                size = len(generate_subset_font(font_file, union)[1])
+                estimator.calibrate(len(union), size)
+                self.__print_info("Estimates calibrated against a subset with all the %d glyphs (%d bytes)." % (len(union), size))
+            except Exception as e:
+                self.__print_error("Unable to calibrate the estimates: %s" % (e))
+        else:
+            self.__print_info("Estimates not calibrated against a real subset (this requires the Python module 'fontforge').")
+
+        self.__print_info("Pairwise overlap (Ebook\tEbook\tShared glyphs\tJaccard index):")
+        for i in range(len(ebooks)):
+            for j in range(i + 1, len(ebooks)):
+                shared = len(ebooks[i][1].intersection(ebooks[j][1]))
+                total = len(ebooks[i][1].union(ebooks[j][1]))
+                print "%s\t%s\t%d\t%.3f" % (ebooks[i][0], ebooks[j][0], shared, (float(shared) / total) if (total > 0) else 1.0)
+
+        # clusters of ebooks sharing a subset: [ codepoint set, ebook files ]
+        shared_clusters = [[union, [x[0] for x in ebooks]]]
+        options = [
+            ["per-ebook", [[x[1], [x[0]]] for x in ebooks]],
+            ["shared", shared_clusters]
+        ]
+        chosen = shared_clusters
+        if (budget != None):
+            # greedy: largest ebooks first, each joining the cluster it grows the least,
+            # provided that the cluster stays within budget
+            clusters = []
+            for ebook_file, codepoint_set in sorted(ebooks, key=lambda x: (-len(x[1]), x[0])):
+                best = None
+                for cluster in clusters:
+                    merged = cluster[0].union(codepoint_set)
+                    size = estimator.estimate(len(merged))
+                    growth = size - estimator.estimate(len(cluster[0]))
+                    if ((size <= budget) and ((best == None) or (growth < best[0]))):
+                        best = [growth, cluster, merged]
+                if (best == None):
+                    clusters.append([codepoint_set, [ebook_file]])
+                else:
+                    best[1][0] = best[2]
+                    best[1][1].append(ebook_file)
+            options.append(["clustered", clusters])
+            chosen = clusters
+
+        self.__print_info("Options (Option\tSubsets\tLargest subset (bytes)\tTotal (bytes)), estimated sizes:")
+        for name, clusters in options:
+            sizes = [estimator.estimate(len(c[0])) for c in clusters] or [0]
+            print "%s\t%d\t%d\t%d" % (name, len(clusters), max(sizes), sum(sizes))
+
+        if (budget != None):
+            self.__print_info("Clusters within budget %d bytes (Cluster\tGlyphs\tEstimated size (bytes)\tEbooks):" % (budget))
+            for i in range(len(chosen)):
+                size = estimator.estimate(len(chosen[i][0]))
+                over = " (over budget)" if (size > budget) else ""
+                print "%d\t%d\t%d%s\t%s" % (i + 1, len(chosen[i][0]), size, over, ", ".join(chosen[i][1]))
+
+        if ("output" in self.__args):
+            try:
+                import multiprocessing
+                if (not os.path.isdir(self.__args.output)):
+                    os.makedirs(self.__args.output)
+                del SUBSET_FONTS[:]
+                SUBSET_FONTS.append([self.__get_fontforge().open(font_file), font_codepoint_set])
+            except Exception as e:
+                self.__print_error(str(e))
+                return CustomParser.EXIT_CODE_COMMAND_FAILED
+            # the subsets are "shared.font.ttf" or "cluster1.font.ttf", "cluster2.font.ttf", ...
+            jobs = []
+            for i in range(len(chosen)):
+                prefix = "shared" if (budget == None) else "cluster%d" % (i + 1)
+                jobs.append([0, chosen[i][0], False, os.path.join(self.__args.output, prefix + "." + os.path.basename(font_file))])
+            # as in __do_subset_batch, each subset runs in a fresh clone of the font
+            pool = multiprocessing.Pool(self.__get_jobs(), maxtasksperchild=1)
+            try:
+                self.__print_info("Generated subsets (Subset\tSize (bytes)\tEstimated size (bytes)\tEbooks):")
+                for job, cluster, [size, error] in itertools.izip(jobs, chosen, pool.imap(subset_font_with_codepoints, jobs)):
+                    if (error != None):
+                        self.__print_error("Unable to generate '%s': %s" % (job[3], error))
+                        returnCode |= CustomParser.EXIT_CODE_COMMAND_FAILED
+                    else:
+                        print "%s\t%d\t%d\t%s" % (job[3], size, estimator.estimate(len(cluster[0])), ", ".join(cluster[1]))
+            finally:
+                pool.close()
+                pool.join()
+        return returnCode
+
+    # serve requests until interrupted, one at a time,
+    # over a Unix socket (one JSON request per line, one JSON reply per line)
+    # or over HTTP on 127.0.0.1 (one JSON request per POST)
+    def __do_serve(self):
+        import BaseHTTPServer, SocketServer, json
+        # warm up the indices shared by all the requests
+        self.__get_block_index()
+        if (GlyphIgo.__name_index == None):
+            GlyphIgo.__name_index = UnicodeNameIndex()
+
+        def reply(data):
+            try:
+                request = json.loads(data)
+                response = run_request(request["arguments"], request.get("cwd"))
+            except Exception as e:
+                response = {"exit_code": CustomParser.EXIT_CODE_COMMAND_FAILED, "stdout": "", "stderr": "[ERROR] Invalid request: %s\n" % (e)}
+            return json.dumps(response)
+
+        class SocketHandler(SocketServer.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if (len(line.strip()) > 0):
+                        self.wfile.write(reply(line) + "\n")
+                        self.wfile.flush()
+
+        class HTTPHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def do_POST(self):
+                # web pages can POST to 127.0.0.1 too, but only as "simple" requests
+                # (e.g., text/plain) or carrying their Origin
+                if (self.headers.getheader("origin") != None):
+                    self.send_error(403, "Cross-origin requests are not allowed")
+                    return
+                if (self.headers.getheader("content-type", "").split(";")[0].strip().lower() != "application/json"):
+                    self.send_error(415, "Requests must be application/json")
+                    return
+                body = reply(self.rfile.read(int(self.headers.getheader("content-length", 0))))
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            if ("socket" in self.__args):
+                if (os.path.exists(self.__args.socket)):
+                    os.remove(self.__args.socket)
+                server = SocketServer.UnixStreamServer(self.__args.socket, SocketHandler)
+                address = self.__args.socket
+            else:
+                server = BaseHTTPServer.HTTPServer(("127.0.0.1", int(self.__args.port)), HTTPHandler)
+                address = "http://127.0.0.1:%s/" % (self.__args.port)
+        except Exception as e:
+            self.__print_error(str(e))
+            return CustomParser.EXIT_CODE_COMMAND_FAILED
+        self.__print_info("Serving %s requests on %s, press CTRL+C to stop." % (", ".join(SERVE_COMMANDS), address))
+        sys.stdout.flush()
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if ("socket" in self.__args):
+                os.remove(self.__args.socket)
+        return CustomParser.EXIT_CODE_OK
+
     def execute(self):
         returnCode = CustomParser.EXIT_CODE_OK
         command = self.__args.command
 
+        if (command == CustomParser.COMMAND_CACHE):
+            returnCode = self.__do_cache()
+
         if (command == CustomParser.COMMAND_CHECK):
-            returnCode = self.__do_check() 
+            if ("batch" in self.__args):
+                returnCode = self.__do_check_batch()
+            elif (("font" in self.__args) and (len(self.__args.font) > 1)):
+                returnCode = self.__do_check_stack()
+            else:
+                returnCode = self.__do_check()
 
         if (command == CustomParser.COMMAND_CONVERT):
             returnCode = self.__do_convert()
 
         if (command == CustomParser.COMMAND_COUNT):
-            returnCode = self.__do_count()
+            if ("documents" in self.__args):
+                returnCode = self.__do_documents()
+            else:
+                returnCode = self.__do_count()
 
         if (command == CustomParser.COMMAND_LIST):
-            returnCode = self.__do_list()
+            if ("documents" in self.__args):
+                returnCode = self.__do_documents()
+            else:
+                returnCode = self.__do_list()
 
         if (command == CustomParser.COMMAND_LOOKUP):
             returnCode = self.__do_lookup()
@@ -1329,13 +3829,101 @@ class GlyphIgo:
         if (command == CustomParser.COMMAND_OBFUSCATE):
             returnCode = self.__do_obfuscate()
 
+        if (command == CustomParser.COMMAND_SERVE):
+            returnCode = self.__do_serve()
+
         if (command == CustomParser.COMMAND_SUBSET):
-            returnCode = self.__do_subset()
+            if ("plan" in self.__args):
+                returnCode = self.__do_subset_plan()
+            elif ("batch" in self.__args):
+                returnCode = self.__do_subset_batch()
+            else:
+                returnCode = self.__do_subset()
+
+        if (self.__pool != None):
+            self.__pool.close()
+            self.__pool.join()
+            self.__pool = None
 
         return returnCode
 
 
 
+# commands which can be requested to a server
+SERVE_COMMANDS = [
+    CustomParser.COMMAND_CHECK,
+    CustomParser.COMMAND_COUNT,
+    CustomParser.COMMAND_LIST,
+    CustomParser.COMMAND_LOOKUP
+]
+
+# options which write files, refused in requests to a server
+SERVE_FORBIDDEN_OPTIONS = [
+    ["epub", "--epub"],
+    ["manifest", "--manifest"],
+    ["output", "--output"]
+]
+
+# helper: run glyphIgo with the given arguments (as on the command line)
+# in directory cwd, as requested to a server, capturing its output;
+# return { "exit_code": ..., "stdout": ..., "stderr": ... }
+# helper: encode a command line argument received by a server (unicode,
+# as decoded from JSON) as a command line would pass it (bytes),
+# in the encoding of the file system, or in UTF-8 if that cannot encode it
+# (e.g., ASCII under the C locale)
+def encode_argument(argument):
+    if (not isinstance(argument, unicode)):
+        return argument
+    try:
+        return argument.encode(sys.getfilesystemencoding() or "utf-8")
+    except (UnicodeEncodeError, LookupError):
+        return argument.encode("utf-8")
+
+def run_request(arguments, cwd=None):
+    import cStringIO
+    arguments = [encode_argument(a) for a in arguments]
+    if (cwd != None):
+        cwd = encode_argument(cwd)
+    stdout = sys.stdout
+    stderr = sys.stderr
+    directory = os.getcwd()
+    out = cStringIO.StringIO()
+    err = cStringIO.StringIO()
+    sys.stdout = codecs.getwriter("utf-8")(out)
+    sys.stderr = codecs.getwriter("utf-8")(err)
+    try:
+        if (cwd != None):
+            os.chdir(cwd)
+        if ((len(arguments) == 0) or (not (arguments[0] in SERVE_COMMANDS))):
+            sys.stderr.write("[ERROR] Only commands %s can be requested to a server\n" % (", ".join(SERVE_COMMANDS)))
+            returnCode = CustomParser.EXIT_CODE_INVALID_ARGUMENT
+        else:
+            # argparse exits on invalid arguments (and on -h)
+            try:
+                args = CustomParser().get_arguments(arguments)
+                forbidden = [x[1] for x in SERVE_FORBIDDEN_OPTIONS if (x[0] in args)]
+                if (len(forbidden) > 0):
+                    sys.stderr.write("[ERROR] Options writing files (%s) cannot be requested to a server\n" % (", ".join(forbidden)))
+                    returnCode = CustomParser.EXIT_CODE_INVALID_ARGUMENT
+                else:
+                    returnCode = GlyphIgo(args).execute()
+            except SystemExit as e:
+                returnCode = e.code
+                if (returnCode == None):
+                    returnCode = CustomParser.EXIT_CODE_OK
+    except Exception as e:
+        sys.stderr.write("[ERROR] %s\n" % (e))
+        returnCode = CustomParser.EXIT_CODE_COMMAND_FAILED
+    finally:
+        sys.stdout = stdout
+        sys.stderr = stderr
+        os.chdir(directory)
+    return {
+        "exit_code": returnCode,
+        "stdout": out.getvalue().decode("utf-8", "replace"),
+        "stderr": err.getvalue().decode("utf-8", "replace")
+    }
+
 def main():
     # read command line parameters
     args = CustomParser().get_arguments()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__license__     = 'MIT'
+__author__      = 'Alberto Pettarin (alberto@albertopettarin.it)'
+__copyright__   = '2012-2026 Alberto Pettarin (alberto@albertopettarin.it)'
+__version__     = 'v1.0.0'
+__date__        = '2026-10-16'
+__description__ = 'glyphIgoClient sends a command to a glyphIgo server started with glyphIgo.py serve'
+
+### BEGIN changelog ###
+#
+# 1.0.0 2026-10-16 Initial release
+#
+### END changelog ###
+
+import json, os, socket, sys
+
+class glyphIgoClient:
+
+    # same as glyphIgo CustomParser.EXIT_CODE_COMMAND_FAILED,
+    # returned when the server cannot be reached
+    EXIT_CODE_COMMAND_FAILED = 8
+
+    ### BEGIN sendSocket ###
+    # sendSocket(path, request)
+    # sends request (JSON) to the server listening on the Unix socket path,
+    # and returns its reply (JSON)
+    def sendSocket(self, path, request):
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.connect(path)
+        s.sendall(request + "\n")
+        f = s.makefile("rb")
+        reply = f.readline()
+        f.close()
+        s.close()
+        return reply
+    ### END sendSocket ###
+
+    ### BEGIN sendHTTP ###
+    # sendHTTP(port, request)
+    # sends request (JSON) to the server listening on 127.0.0.1:port,
+    # and returns its reply (JSON)
+    def sendHTTP(self, port, request):
+        import httplib
+        connection = httplib.HTTPConnection("127.0.0.1", int(port))
+        connection.request("POST", "/", request, {"Content-Type": "application/json"})
+        reply = connection.getresponse().read()
+        connection.close()
+        return reply
+    ### END sendHTTP ###
+
+    ### BEGIN usage ###
+    # usage()
+    # print script usage
+    def usage(self):
+        print("")
+        print("$ python glyphIgoClient.py -s SOCKET|-p PORT COMMAND [OPTIONS]")
+        print("")
+        print("Arguments:")
+        print(" -s SOCKET: send the command to the server listening on the Unix socket SOCKET")
+        print(" -p PORT: send the command to the server listening on 127.0.0.1:PORT")
+        print(" COMMAND [OPTIONS]: a check, count, list, or lookup command, as for glyphIgo.py")
+        print("")
+        print("Examples:")
+        print(" $ python glyphIgo.py serve --socket /tmp/glyphIgo.sock &")
+        print(" $ python glyphIgoClient.py -s /tmp/glyphIgo.sock check -f font.ttf -e ebook.epub")
+        print("   Check ebook.epub against font.ttf, reusing the fonts and indices already loaded by the server")
+        print("")
+    ### END usage ###
+
+    ### BEGIN main ###
+    def main(self):
+        if ((len(sys.argv) < 4) or (not (sys.argv[1] in ["-s", "-p"]))):
+            self.usage()
+            return self.EXIT_CODE_COMMAND_FAILED
+
+        # relative paths are resolved by the server in the current directory
+        request = json.dumps({"arguments": sys.argv[3:], "cwd": os.getcwd()})
+        try:
+            if (sys.argv[1] == "-s"):
+                reply = self.sendSocket(sys.argv[2], request)
+            else:
+                reply = self.sendHTTP(sys.argv[2], request)
+            reply = json.loads(reply)
+        except Exception as e:
+            sys.stderr.write("[ERROR] Cannot reach the glyphIgo server at %s: %s\n" % (sys.argv[2], e))
+            return self.EXIT_CODE_COMMAND_FAILED
+
+        sys.stdout.write(reply["stdout"].encode("utf-8"))
+        sys.stderr.write(reply["stderr"].encode("utf-8"))
+        return reply["exit_code"]
+    ### END main ###
+
+
+if __name__ == '__main__':
+    c = glyphIgoClient()
+    sys.exit(c.main())
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# run with: python -m unittest discover tests
+
+import csv, json, os, re, StringIO, sys, unittest
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+import glyphIgo
+
+class TestCharListWriter(unittest.TestCase):
+
+    # characters which need quoting or escaping in some format
+    CHARS = [[u"\t", 1], [u"\n", 2], [u"\"", 3], [u",", 4], [u"\\", 5], [u"A", 6], [u"\u00e9", 7], [u"\U0001F600", 8]]
+    FONTS = { 0x41: "a, \"b\".ttf" }
+
+    def write(self, output_format, chars, encoding="utf-8", quiet=False):
+        stream = StringIO.StringIO()
+        writer = glyphIgo.CharListWriter(stream, output_format, quiet, encoding, lambda c: u"Block %d" % (c // 128), lambda c: self.FONTS.get(c))
+        writer.write(chars)
+        writer.flush()
+        return stream.getvalue()
+
+    def check_rows(self, rows, chars):
+        self.assertEqual(len(rows), len(chars))
+        for row, [char, count] in zip(rows, chars):
+            codepoint = ord(char)
+            self.assertEqual(row["character"], char)
+            self.assertEqual(int(row["codepoint"]), codepoint)
+            self.assertEqual(row["hex"], hex(codepoint))
+            self.assertEqual(row["name"], glyphIgo.unicodedata.name(char, u""))
+            self.assertEqual(row["block"], u"Block %d" % (codepoint // 128))
+            self.assertEqual(int(row["count"]), count)
+            self.assertEqual(row["font"] or None, self.FONTS.get(codepoint))
+
+    def test_jsonl(self):
+        data = self.write(glyphIgo.CharListWriter.FORMAT_JSONL, self.CHARS)
+        self.check_rows([json.loads(line) for line in data.decode("utf-8").split(u"\n")[:-1]], self.CHARS)
+
+    def test_tsv(self):
+        escapes = { "t": u"\t", "n": u"\n", "r": u"\r", "\\": u"\\" }
+        lines = self.write(glyphIgo.CharListWriter.FORMAT_TSV, self.CHARS).decode("utf-8").split(u"\n")[:-1]
+        fields = lines[0].split(u"\t")
+        self.assertEqual(fields, glyphIgo.CharListWriter.FIELDS + ["font"])
+        rows = []
+        for line in lines[1:]:
+            values = [re.sub(r"\\(.)", lambda m: escapes[m.group(1)], v) for v in line.split(u"\t")]
+            rows.append(dict(zip(fields, values)))
+        self.check_rows(rows, self.CHARS)
+
+    def test_csv(self):
+        data = self.write(glyphIgo.CharListWriter.FORMAT_CSV, self.CHARS)
+        reader = csv.reader(StringIO.StringIO(data))
+        fields = reader.next()
+        self.assertEqual(fields, glyphIgo.CharListWriter.FIELDS + ["font"])
+        rows = [dict(zip(fields, [v.decode("utf-8") for v in row])) for row in reader]
+        self.check_rows(rows, self.CHARS)
+
+    def test_text(self):
+        data = self.write(glyphIgo.CharListWriter.FORMAT_TEXT, [[u"\t", 1], [u"A", 2]] + [u"\u00e9"])
+        self.assertEqual(data.decode("utf-8"), u"'\\t'\t9\t0x9\tUNKNOWN NAME\t1\n'A'\t65\t0x41\tLATIN CAPITAL LETTER A\t2\n'\u00e9'\t233\t0xe9\tLATIN SMALL LETTER E WITH ACUTE\n")
+        self.assertEqual(self.write(glyphIgo.CharListWriter.FORMAT_TEXT, [[u"A", 2], [u"B", 1]], quiet=True), "65\n66\n")
+
+    def test_encoding(self):
+        # characters the encoding cannot represent are escaped
+        data = self.write(glyphIgo.CharListWriter.FORMAT_TEXT, [[u"\u00e9", 1]], encoding="ascii")
+        self.assertEqual(data, "'\\xe9'\t233\t0xe9\tLATIN SMALL LETTER E WITH ACUTE\t1\n")
+
+    def test_batches(self):
+        chars = [[unichr(c), 1] for c in range(0x4e00, 0x4e00 + 2 * glyphIgo.CharListWriter.BATCH_SIZE + 1)]
+        lines = self.write(glyphIgo.CharListWriter.FORMAT_JSONL, chars).split("\n")[:-1]
+        self.assertEqual([json.loads(line)["codepoint"] for line in lines], [ord(c[0]) for c in chars])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# run with: python -m unittest discover tests
+
+import os, shutil, struct, sys, tempfile, unittest, zlib
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+import glyphIgo
+
+# helpers building tiny fonts with only the cmap and maxp tables
+
+def cmap_table(subtables):
+    # subtables = [ [ platform id, encoding id, subtable ], ... ]
+    header = struct.pack(">HH", 0, len(subtables))
+    offset = 4 + 8 * len(subtables)
+    records = ""
+    data = ""
+    for platform_id, encoding_id, subtable in subtables:
+        records += struct.pack(">HHL", platform_id, encoding_id, offset + len(data))
+        data += subtable
+    return header + records + data
+
+def cmap_format_0(glyphs):
+    glyphs = glyphs + [0] * (256 - len(glyphs))
+    return struct.pack(">HHH256B", 0, 262, 0, *glyphs)
+
+def cmap_format_4(segments):
+    # segments = [ [ start, stop, delta, glyph ids or None ], ... ]
+    segments = segments + [[0xffff, 0xffff, 1, None]]
+    count = len(segments)
+    range_offsets = []
+    glyph_array = []
+    for i in range(count):
+        start, stop, delta, glyphs = segments[i]
+        if (glyphs == None):
+            range_offsets.append(0)
+        else:
+            range_offsets.append(2 * (count - i) + 2 * len(glyph_array))
+            glyph_array += glyphs
+    data = struct.pack(">%dH" % (count), *[s[1] for s in segments]) + struct.pack(">H", 0)
+    data += struct.pack(">%dH" % (count), *[s[0] for s in segments])
+    data += struct.pack(">%dH" % (count), *[s[2] & 0xffff for s in segments])
+    data += struct.pack(">%dH" % (count), *range_offsets)
+    data += struct.pack(">%dH" % (len(glyph_array)), *glyph_array)
+    return struct.pack(">HHHHHHH", 4, 14 + len(data), 0, 2 * count, 0, 0, 0) + data
+
+def cmap_format_6(first_code, glyphs):
+    return struct.pack(">HHHHH%dH" % (len(glyphs)), 6, 10 + 2 * len(glyphs), 0, first_code, len(glyphs), *glyphs)
+
+def cmap_format_12(groups, fmt=12):
+    data = "".join([struct.pack(">LLL", *g) for g in groups])
+    return struct.pack(">HHLLL", fmt, 0, 16 + len(data), 0, len(groups)) + data
+
+def font_tables(subtables, num_glyphs=20):
+    return {"cmap": cmap_table(subtables), "maxp": struct.pack(">LH", 0x00005000, num_glyphs)}
+
+def sfnt(tables):
+    tags = sorted(tables.keys())
+    header = struct.pack(">4sHHHH", "\x00\x01\x00\x00", len(tags), 0, 0, 0)
+    offset = 12 + 16 * len(tags)
+    directory = ""
+    data = ""
+    for tag in tags:
+        directory += struct.pack(">4sLLL", tag, 0, offset + len(data), len(tables[tag]))
+        data += tables[tag] + "\x00" * ((4 - len(tables[tag]) % 4) % 4)
+    return header + directory + data
+
+def woff(tables):
+    tags = sorted(tables.keys())
+    offset = 44 + 20 * len(tags)
+    directory = ""
+    data = ""
+    for tag in tags:
+        compressed = zlib.compress(tables[tag])
+        if (len(compressed) >= len(tables[tag])):
+            compressed = tables[tag]
+        directory += struct.pack(">4sLLLL", tag, offset + len(data), len(compressed), len(tables[tag]), 0)
+        data += compressed + "\x00" * ((4 - len(compressed) % 4) % 4)
+    header = struct.pack(">4s4sLHHLHHLLLLL", "wOFF", "\x00\x01\x00\x00", offset + len(data), len(tags), 0, 0, 1, 0, 0, 0, 0, 0, 0)
+    return header + directory + data
+
+def woff2(tables, brotli):
+    def base128(value):
+        groups = [value & 0x7f]
+        value >>= 7
+        while (value > 0):
+            groups.insert(0, (value & 0x7f) | 0x80)
+            value >>= 7
+        return "".join([chr(g) for g in groups])
+    tags = sorted(tables.keys())
+    directory = ""
+    for tag in tags:
+        # known tag, null transform (version 0)
+        directory += chr(glyphIgo.CmapReader.WOFF2_KNOWN_TAGS.index(tag)) + base128(len(tables[tag]))
+    compressed = brotli.compress("".join([tables[tag] for tag in tags]))
+    header = struct.pack(">4s4sLHHLLHHLLLLL", "wOF2", "\x00\x01\x00\x00", 48 + len(directory) + len(compressed), len(tags), 0, 0, len(compressed), 1, 0, 0, 0, 0, 0, 0)
+    return header + directory + compressed
+
+class TestCmapReader(unittest.TestCase):
+
+    # format 4: a delta segment, a delta segment with one codepoint mapped to glyph 0,
+    # and a segment with glyph ids (one of them 0);
+    # format 12: a group, and a group whose first codepoint maps to glyph 0
+    SUBTABLES = [
+        [3, 1, cmap_format_4([[0x41, 0x43, -0x40, None], [0x50, 0x52, -0x51, None], [0x60, 0x63, 0, [5, 0, 6, 7]]])],
+        [3, 10, cmap_format_12([[0x1F600, 0x1F602, 10], [0x20000, 0x20001, 0]])]
+    ]
+    RANGES = [[0x41, 0x43], [0x50, 0x50], [0x52, 0x52], [0x60, 0x60], [0x62, 0x63], [0x1F600, 0x1F602], [0x20001, 0x20001]]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def reader(self, data, extension=".ttf"):
+        font_file = os.path.join(self.directory, "font" + extension)
+        f = open(font_file, "wb")
+        f.write(data)
+        f.close()
+        return glyphIgo.CmapReader(font_file)
+
+    def ranges(self, data, extension=".ttf"):
+        return self.reader(data, extension).get_codepoint_set().get_ranges()
+
+    def test_formats_4_and_12(self):
+        self.assertEqual(self.ranges(sfnt(font_tables(self.SUBTABLES))), self.RANGES)
+
+    def test_formats_0_6_13(self):
+        self.assertEqual(self.ranges(sfnt(font_tables([[0, 3, cmap_format_0([0] * 0x20 + [1, 0, 2])]]))), [[0x20, 0x20], [0x22, 0x22]])
+        self.assertEqual(self.ranges(sfnt(font_tables([[0, 3, cmap_format_6(0x100, [1, 0, 2])]]))), [[0x100, 0x100], [0x102, 0x102]])
+        self.assertEqual(self.ranges(sfnt(font_tables([[0, 6, cmap_format_12([[0x3000, 0x3002, 5], [0x4000, 0x4001, 0]], 13)]]))), [[0x3000, 0x3002]])
+
+    def test_symbol(self):
+        symbol = [3, 0, cmap_format_4([[0xF020, 0xF021, 1, None]])]
+        unicode = [3, 1, cmap_format_4([[0x41, 0x41, 1, None]])]
+        # the Symbol subtable is used only without Unicode subtables
+        self.assertEqual(self.ranges(sfnt(font_tables([symbol]))), [[0xF020, 0xF021]])
+        self.assertEqual(self.ranges(sfnt(font_tables([symbol, unicode]))), [[0x41, 0x41]])
+
+    def test_unsupported(self):
+        mac = [1, 0, cmap_format_0([1] * 256)]
+        self.assertRaises(Exception, self.reader(sfnt(font_tables([mac]))).get_codepoint_set)
+        self.assertRaises(Exception, self.reader("not a font").get_codepoint_set)
+
+    def test_tables(self):
+        tables = font_tables(self.SUBTABLES, 42)
+        for data in [sfnt(tables), woff(tables)]:
+            reader = self.reader(data)
+            self.assertEqual(reader.get_num_glyphs(), 42)
+            self.assertEqual(reader.get_table_lengths(), dict([[tag, len(tables[tag])] for tag in tables]))
+
+    def test_woff(self):
+        self.assertEqual(self.ranges(woff(font_tables(self.SUBTABLES)), ".woff"), self.RANGES)
+
+    def test_woff2(self):
+        brotli = glyphIgo.import_optional("brotli")
+        if (brotli == None):
+            self.skipTest("the Python module 'brotli' is not available")
+        tables = font_tables(self.SUBTABLES, 42)
+        reader = self.reader(woff2(tables, brotli), ".woff2")
+        self.assertEqual(reader.get_codepoint_set().get_ranges(), self.RANGES)
+        self.assertEqual(reader.get_num_glyphs(), 42)
+        self.assertEqual(reader.get_table_lengths(), dict([[tag, len(tables[tag])] for tag in tables]))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# run with: python -m unittest discover tests
+
+import os, random, sys, unittest
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+import glyphIgo
+
+class TestCodepointSet(unittest.TestCase):
+
+    def random_codepoints(self, generator):
+        # a few runs of consecutive codepoints, and some isolated ones
+        codepoints = set()
+        for i in range(generator.randint(0, 5)):
+            start = generator.randint(0, 300)
+            codepoints.update(range(start, start + generator.randint(1, 40)))
+        for i in range(generator.randint(0, 20)):
+            codepoints.add(generator.randint(0, 400))
+        return codepoints
+
+    def assertSameSet(self, codepoint_set, codepoints):
+        self.assertEqual(list(codepoint_set), sorted(codepoints))
+        self.assertEqual(len(codepoint_set), len(codepoints))
+        for c in range(-1, 402):
+            self.assertEqual(c in codepoint_set, c in codepoints)
+
+    def test_against_set(self):
+        generator = random.Random(42)
+        for i in range(200):
+            a = self.random_codepoints(generator)
+            b = self.random_codepoints(generator)
+            x = glyphIgo.CodepointSet(a)
+            y = glyphIgo.CodepointSet(b)
+            self.assertSameSet(x, a)
+            self.assertSameSet(x.union(y), a | b)
+            self.assertSameSet(x.intersection(y), a & b)
+            self.assertSameSet(x.difference(y), a - b)
+
+    def test_ranges(self):
+        s = glyphIgo.CodepointSet.from_ranges([[10, 12], [0, 0], [13, 15], [11, 11], [20, 20]])
+        self.assertEqual(s.get_ranges(), [[0, 0], [10, 15], [20, 20]])
+        self.assertEqual(glyphIgo.CodepointSet([3, 1, 2, 2, 7]).get_ranges(), [[1, 3], [7, 7]])
+        self.assertEqual(glyphIgo.CodepointSet.from_ranges([[0x10FFFE, 0x10FFFF]]).get_ranges(), [[0x10FFFE, 0x10FFFF]])
+
+    def test_empty(self):
+        empty = glyphIgo.CodepointSet()
+        s = glyphIgo.CodepointSet([65])
+        self.assertEqual(len(empty), 0)
+        self.assertFalse(65 in empty)
+        self.assertEqual(list(s.union(empty)), [65])
+        self.assertEqual(list(s.intersection(empty)), [])
+        self.assertEqual(list(s.difference(s)), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# run with: python -m unittest discover tests
+
+import binascii, hashlib, os, shutil, subprocess, sys, tempfile, unittest, zipfile
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+import glyphIgo
+
+class TestObfuscation(unittest.TestCase):
+
+    UID = "urn:uuid:9a0ca9ab-9e33-4181-b2a3-e7f2ceb8e9bd"
+    UID_BYTES = binascii.unhexlify("9a0ca9ab9e334181b2a3e7f2ceb8e9bd")
+    FONT = "".join([chr(i % 251) for i in range(3000)])
+    CONTAINER = ('<?xml version="1.0"?>\n'
+                 '<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">'
+                 '<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>'
+                 '</container>')
+
+    # the Adobe algorithm, as specified: XOR the first 1024 bytes
+    # with the 16 bytes of the UUID, repeated
+    def adobe_obfuscate(self, font):
+        header = [chr(ord(c) ^ ord(self.UID_BYTES[i % 16])) for i, c in enumerate(font[:1024])]
+        return "".join(header) + font[1024:]
+
+    def create_ebook(self, path, font):
+        opf = ('<?xml version="1.0" encoding="utf-8"?>\n'
+               '<package xmlns="http://www.idpf.org/2007/opf" version="2.0" unique-identifier="uid">'
+               '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/"><dc:identifier id="uid">%s</dc:identifier></metadata>'
+               '<manifest><item id="f" href="fonts/f.ttf" media-type="application/x-font-ttf"/></manifest>'
+               '<spine/></package>' % (self.UID))
+        encryption = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+                      '<encryption xmlns="urn:oasis:names:tc:opendocument:xmlns:container" xmlns:enc="http://www.w3.org/2001/04/xmlenc#">'
+                      '<enc:EncryptedData><enc:EncryptionMethod Algorithm="http://ns.adobe.com/pdf/enc#RC"/>'
+                      '<enc:CipherData><enc:CipherReference URI="OEBPS/fonts/f.ttf"/></enc:CipherData></enc:EncryptedData>'
+                      '</encryption>')
+        z = zipfile.ZipFile(path, "w")
+        z.writestr("mimetype", "application/epub+zip")
+        z.writestr("META-INF/container.xml", self.CONTAINER)
+        z.writestr("META-INF/encryption.xml", encryption)
+        z.writestr("OEBPS/content.opf", opf)
+        z.writestr("OEBPS/fonts/f.ttf", font, zipfile.ZIP_DEFLATED)
+        z.close()
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_adobe_mask(self):
+        mask = glyphIgo.get_obfuscation_mask(self.UID, False)
+        self.assertEqual(len(mask), 1024)
+        self.assertEqual(mask, self.UID_BYTES * 64)
+
+    def test_adobe_requires_uuid(self):
+        self.assertRaises(Exception, glyphIgo.get_obfuscation_mask, "isbn:9781234567897", False)
+
+    def test_adobe_deobfuscate_ebook(self):
+        ebook = os.path.join(self.directory, "book.epub")
+        output = os.path.join(self.directory, "out.epub")
+        self.create_ebook(ebook, self.adobe_obfuscate(self.FONT))
+        devnull = open(os.devnull, "w")
+        code = subprocess.call([sys.executable, os.path.join(SRC, "glyphIgo.py"), "obfuscate", "-e", ebook, "--deobfuscate", "-o", output], stdout=devnull)
+        devnull.close()
+        self.assertEqual(code, 0)
+        z = zipfile.ZipFile(output)
+        self.assertEqual(z.read("OEBPS/fonts/f.ttf"), self.FONT)
+        self.assertFalse("META-INF/encryption.xml" in z.namelist())
+        z.close()
+
+    def test_idpf_non_ascii(self):
+        ebook = os.path.join(self.directory, "book.epub")
+        obfuscated = os.path.join(self.directory, "obfuscated.epub")
+        output = os.path.join(self.directory, "out.epub")
+        name = u"OEBPS/fonts/caf\u00e9 font.ttf"
+        uid = u"urn:isbn:caf\u00e9"
+        opf = (u'<?xml version="1.0" encoding="utf-8"?>\n'
+               u'<package xmlns="http://www.idpf.org/2007/opf" version="2.0" unique-identifier="uid">'
+               u'<metadata xmlns:dc="http://purl.org/dc/elements/1.1/"><dc:identifier id="uid">%s</dc:identifier></metadata>'
+               u'<manifest><item id="f" href="fonts/caf%%C3%%A9%%20font.ttf" media-type="application/x-font-ttf"/></manifest>'
+               u'<spine/></package>' % (uid))
+        z = zipfile.ZipFile(ebook, "w")
+        z.writestr("mimetype", "application/epub+zip")
+        z.writestr("META-INF/container.xml", self.CONTAINER)
+        z.writestr("OEBPS/content.opf", opf.encode("utf-8"))
+        z.writestr(zipfile.ZipInfo(name), self.FONT)
+        z.close()
+        devnull = open(os.devnull, "w")
+        script = os.path.join(SRC, "glyphIgo.py")
+        code = subprocess.call([sys.executable, script, "obfuscate", "-e", ebook, "-o", obfuscated], stdout=devnull)
+        self.assertEqual(code, 0)
+        z = zipfile.ZipFile(obfuscated)
+        self.assertTrue('URI="OEBPS/fonts/caf%C3%A9%20font.ttf"' in z.read("META-INF/encryption.xml"))
+        mask = glyphIgo.get_obfuscation_mask(uid, True)
+        self.assertEqual(mask[:20], hashlib.sha1(uid.encode("utf-8")).digest())
+        self.assertNotEqual(z.read(name), self.FONT)
+        z.close()
+        code = subprocess.call([sys.executable, script, "obfuscate", "-e", obfuscated, "--deobfuscate", "-o", output], stdout=devnull)
+        devnull.close()
+        self.assertEqual(code, 0)
+        z = zipfile.ZipFile(output)
+        self.assertEqual(z.read(name), self.FONT)
+        self.assertFalse("META-INF/encryption.xml" in z.namelist())
+        z.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# run with: python -m unittest discover tests
+
+import os, subprocess, sys, unittest
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+import glyphIgo
+
+class TestRangeCharList(unittest.TestCase):
+
+    def list_range(self, query):
+        process = subprocess.Popen([sys.executable, os.path.join(SRC, "glyphIgo.py"), "list", "-r", query], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stdout, stderr = process.communicate()
+        return [process.returncode, stdout, stderr]
+
+    def test_iterate(self):
+        chars = glyphIgo.RangeCharList(glyphIgo.CodepointSet.from_ranges([[0x41, 0x43], [0x10FFFF, 0x10FFFF]]))
+        self.assertEqual(len(chars), 4)
+        self.assertEqual(list(chars), [[u"A", 1], [u"B", 1], [u"C", 1], [u"\U0010FFFF", 1]])
+        # it can be iterated more than once
+        self.assertEqual(list(chars), list(chars))
+
+    def test_list_ranges(self):
+        code, stdout, stderr = self.list_range("0x41-0x42,x43-x43,68-68")
+        self.assertEqual(code, 0)
+        self.assertEqual([line.split("\t")[0] for line in stdout.splitlines()[1:]], ["'A'", "'B'", "'C'", "'D'"])
+
+    def test_list_last_codepoint(self):
+        code, stdout, stderr = self.list_range("0x10fffe-0x10ffff")
+        self.assertEqual(code, 0)
+
+    def test_list_beyond_last_codepoint(self):
+        for query in ["0x110000-0x110001", "0x10fffe-0x110001"]:
+            code, stdout, stderr = self.list_range(query)
+            self.assertEqual(code, glyphIgo.CustomParser.EXIT_CODE_COMMAND_FAILED)
+            self.assertTrue(stderr.startswith("[ERROR]"), stderr)
+
+    def test_list_reversed_range(self):
+        code, stdout, stderr = self.list_range("0x42-0x41")
+        self.assertEqual(code, glyphIgo.CustomParser.EXIT_CODE_COMMAND_FAILED)
+        self.assertTrue(stderr.startswith("[ERROR]"), stderr)
+
+if __name__ == "__main__":
+    unittest.main()
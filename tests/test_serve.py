@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# run with: python -m unittest discover tests
+
+import json, os, shutil, socket, subprocess, sys, tempfile, time, unittest
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+import glyphIgo
+
+class TestServe(unittest.TestCase):
+
+    # "café.txt", with characters outside ASCII also in its contents
+    PLAIN = u"café.txt"
+    TEXT = u"café ☃\n"
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.socket = os.path.join(self.directory, "glyphIgo.sock")
+        f = open(os.path.join(self.directory, self.PLAIN.encode("utf-8")), "wb")
+        f.write(self.TEXT.encode("utf-8"))
+        f.close()
+        # the C locale cannot encode non-ASCII file names
+        env = dict(os.environ)
+        env["LC_ALL"] = "C"
+        env["LANG"] = "C"
+        env.pop("PYTHONIOENCODING", None)
+        env["XDG_CACHE_HOME"] = self.directory
+        self.devnull = open(os.devnull, "w")
+        self.server = subprocess.Popen([sys.executable, os.path.join(SRC, "glyphIgo.py"), "serve", "--socket", self.socket], stdout=self.devnull, stderr=self.devnull, env=env)
+        for i in range(100):
+            if (os.path.exists(self.socket)):
+                break
+            time.sleep(0.1)
+
+    def tearDown(self):
+        self.server.terminate()
+        self.server.wait()
+        self.devnull.close()
+        shutil.rmtree(self.directory)
+
+    def send(self, arguments):
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.connect(self.socket)
+        s.sendall(json.dumps({"arguments": arguments, "cwd": self.directory.decode("utf-8")}) + "\n")
+        f = s.makefile("rb")
+        reply = json.loads(f.readline())
+        f.close()
+        s.close()
+        return reply
+
+    def test_non_ascii_path(self):
+        reply = self.send([u"list", u"-p", self.PLAIN])
+        self.assertEqual(reply["exit_code"], glyphIgo.CustomParser.EXIT_CODE_OK, reply["stderr"])
+        self.assertTrue(self.PLAIN in reply["stdout"])
+        self.assertTrue(u"☃" in reply["stdout"])
+
+    def test_missing_non_ascii_path(self):
+        reply = self.send([u"count", u"-p", u"missing " + self.PLAIN])
+        self.assertEqual(reply["exit_code"], glyphIgo.CustomParser.EXIT_CODE_COMMAND_FAILED)
+        self.assertTrue(reply["stderr"].startswith(u"[ERROR]"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# run with: python -m unittest discover tests
+
+import os, sys, unittest
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+import glyphIgo
+
+FONT = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+HAS_FONTFORGE = (glyphIgo.import_optional("fontforge") != None)
+
+@unittest.skipUnless(os.path.exists(FONT), "font %s not found" % (FONT))
+class TestSubsetSize(unittest.TestCase):
+
+    # 20 distinct characters
+    TEXT = u"The quick brown fox jumps"
+
+    def setUp(self):
+        self.codepoint_set = glyphIgo.CodepointSet([ord(c) for c in self.TEXT])
+        self.glyph_count = len(self.codepoint_set)
+
+    def test_estimate_small_subset(self):
+        # a handful of glyphs out of thousands: kerning, layout
+        # and glyph names must not be counted whole
+        estimator = glyphIgo.SubsetSizeEstimator(FONT)
+        self.assertTrue(estimator.estimate(self.glyph_count) < os.path.getsize(FONT) // 10)
+        self.assertTrue(estimator.estimate(self.glyph_count) < estimator.estimate(10 * self.glyph_count))
+
+    def test_calibrate(self):
+        estimator = glyphIgo.SubsetSizeEstimator(FONT)
+        estimator.calibrate(self.glyph_count, 16000)
+        self.assertEqual(estimator.estimate(self.glyph_count), 16000)
+        estimator.calibrate(self.glyph_count, 0)
+        self.assertTrue(estimator.estimate(self.glyph_count) >= 0)
+
+    @unittest.skipUnless(HAS_FONTFORGE, "the Python module 'fontforge' is not available")
+    def test_estimate_real_subset(self):
+        size = len(glyphIgo.generate_subset_font(FONT, self.codepoint_set)[1])
+        estimator = glyphIgo.SubsetSizeEstimator(FONT)
+        estimate = estimator.estimate(self.glyph_count)
+        self.assertTrue(size // 2 <= estimate <= size * 2, "estimated %d bytes, real subset %d bytes" % (estimate, size))
+        estimator.calibrate(self.glyph_count, size)
+        self.assertEqual(estimator.estimate(self.glyph_count), size)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# run with: python -m unittest discover tests
+
+import codecs, collections, os, StringIO, sys, unittest
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+import glyphIgo
+
+class TestXHTMLTextCounter(unittest.TestCase):
+
+    def count(self, chunks):
+        counter = glyphIgo.XHTMLTextCounter()
+        for chunk in chunks:
+            counter.feed(chunk)
+        counter.close()
+        return dict(counter.histogram)
+
+    def test_skipped(self):
+        page = (u'<?xml version="1.0"?>\n<html><head><title>T</title><style>p { color: red; }</style></head>'
+                u'<body><!-- hidden --><p class="x">a</p><script>var s = "<p>b</p>";</script><br/><?pi c?></body></html>')
+        self.assertEqual(self.count([page]), {u" ": 1, u"T": 1, u"a": 1})
+
+    def test_cdata(self):
+        self.assertEqual(self.count([u"<p><![CDATA[<x>  &amp;]]></p>"]), {u"<": 1, u"x": 1, u">": 1, u" ": 2, u"&": 1, u"a": 1, u"m": 1, u"p": 1, u";": 1})
+
+    def test_whitespace(self):
+        # newlines are spaces, and runs of spaces collapse within each text node, not across tags
+        self.assertEqual(self.count([u"<p>a \n  b</p> \r\n <p> c</p>"]), {u" ": 3, u"a": 1, u"b": 1, u"c": 1})
+
+    def test_entities(self):
+        self.assertEqual(self.count([u"<p>&amp;&#x41;&#66;&eacute;&nbsp;</p>"]), {u"&": 1, u"A": 1, u"B": 1, u"é": 1, u" ": 1})
+
+    def test_unknown_entities(self):
+        # unknown or malformed entities are text
+        self.assertEqual(self.count([u"<p>AT&T &foo; &#xZZ;</p>"]), self.count([u"<p>AT&amp;T &amp;foo; &amp;#xZZ;</p>"]))
+        self.assertEqual(self.count([u"a &T"]), {u"a": 1, u" ": 1, u"&": 1, u"T": 1})
+
+    def test_chunks(self):
+        # text nodes and entities split between chunks
+        self.assertEqual(self.count([u"<p>a   ", u"  b &am", u"p; c&#x4", u"1;</", u"p>"]), self.count([u"<p>a b &amp; c&#x41;</p>"]))
+
+class TestTextCounter(unittest.TestCase):
+
+    def test_preserve(self):
+        counter = glyphIgo.TextCounter()
+        counter.feed(u"<p>&amp;&#x4")
+        counter.feed(u"1; &foo;</p>")
+        counter.close()
+        self.assertEqual(counter.histogram, collections.Counter(u"<p>&A &foo;</p>"))
+
+class TestDeclaredEncoding(unittest.TestCase):
+
+    def test_declared(self):
+        self.assertEqual(glyphIgo.get_declared_encoding(codecs.BOM_UTF8 + "<p/>"), "utf-8-sig")
+        self.assertEqual(glyphIgo.get_declared_encoding(codecs.BOM_UTF16_LE + "<\x00"), "utf-16")
+        self.assertEqual(glyphIgo.get_declared_encoding("<?xml version='1.0' encoding='ISO-8859-1'?><html/>"), "iso8859-1")
+        self.assertEqual(glyphIgo.get_declared_encoding('<html><head><meta charset="windows-1252"/>'), "cp1252")
+        self.assertEqual(glyphIgo.get_declared_encoding("<html/>"), "utf-8")
+        self.assertRaises(Exception, glyphIgo.get_declared_encoding, '<?xml version="1.0" encoding="nope"?>')
+
+    def test_file_histogram(self):
+        page = u"<?xml version='1.0' encoding='iso-8859-1'?><p>café</p>".encode("iso-8859-1")
+        histogram = glyphIgo.get_file_histogram(codecs.getreader(glyphIgo.get_declared_encoding(page))(StringIO.StringIO(page)))
+        self.assertEqual(dict(histogram), {u"c": 1, u"a": 1, u"f": 1, u"é": 1})
+
+if __name__ == "__main__":
+    unittest.main()